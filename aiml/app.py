@@ -1,10 +1,13 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+import time
+# Startup phases are reported relative to the start of this import
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image
+from fastapi.responses import JSONResponse, StreamingResponse
 import torch
 import numpy as np
 import cv2
-from torchvision import models, transforms
 import random
 import math
 import datetime
@@ -12,20 +15,62 @@ import os
 import base64
 import json
 import hashlib
-from typing import List
+from typing import List, Literal, Optional
 import hashlib 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 import os, requests
+import asyncio
+import itertools
+import threading
+import zipfile
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
-from ultralytics import YOLO
 from typing import List
 
+# Before the local modules, which read their settings from the environment at import
+load_dotenv()
+
+from batching import MicroBatcher
+from preprocess import CropPreprocessor
+from model_backends import FUSED_YOLO_WEIGHTS, fused_spoilage_scores, load_cnn, load_yolo
+from model_registry import get_spoilage_model
+from result_cache import DetectionCache, content_key, perceptual_hash
+from tiling import merge_tile_detections, tile_grid
+from ws_protocol import DeltaResultEncoder, parse_frame_message
+from video_ingest import is_stream_url, iter_video_frames, open_video, video_info
+from video_session import VideoSession
+from video_scheduler import VideoScheduler
+from video_trace import VideoTracer, add_stage, timed
+from resolution import ResolutionController, parse_sizes
+from tracker import IoUTracker
+from scene_gate import SceneChangeGate, frame_signature
+import workers
+from workers import (decode_image, decode_base64_image, decode_image_timed, decode_base64_image_timed,
+                     run_decode, run_frame_decode, run_inference)
+
+# Thread counts / CPU pinning before any inference thread exists (TORCH_THREADS, CPU_AFFINITY...)
+print(f"Thread settings: {workers.configure_threads()}")
+
 """ well if u want to run the yolo model locally u can use the archive scripts.
     Here the yolo model is added in same fastapi for integrating it with frontend.
 """
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Models load after the server is up, so /healthz answers during cold start
+    if BACKGROUND_STARTUP:
+        threading.Thread(target=startup_models, name="model-startup", daemon=True).start()
+    else:
+        await asyncio.to_thread(startup_models)
+    yield
+    manager.scheduler.stop()
+    workers.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -38,13 +83,30 @@ app.add_middleware(
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # /ws/video connections: mailbox, send lock and stats per socket
+        self.sessions = {}
+        # VideoScheduler that runs every session's frames (set once the pipeline is defined)
+        self.scheduler = None
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
 
+    def open_session(self, websocket: WebSocket):
+        # ?results=delta: compact binary deltas instead of full JSON results (ws_protocol.py)
+        result_encoder = DeltaResultEncoder() if websocket.query_params.get("results") == "delta" else None
+        session = VideoSession(websocket, tracker=new_tracker(), scene_gate=new_scene_gate(),
+                               result_encoder=result_encoder, resolution=new_resolution_controller(websocket),
+                               **video_schedule(websocket))
+        self.sessions[websocket] = session
+        self.scheduler.add(session)
+        return session
+
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
+        session = self.sessions.pop(websocket, None)
+        if session is not None:
+            self.scheduler.remove(session)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
@@ -59,41 +121,269 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-# Initialize models with error handling
+# Models are loaded by startup_models() when the app starts, not at import
 yolo_model = None
 model = None
 device = torch.device('cpu')
 
-try:
-    print("Loading YOLO model...")
-    yolo_model = YOLO('models/trained/yolo_apple.pt')
-    print("YOLO model loaded successfully")
-except Exception as e:
-    print(f"Error loading YOLO model: {e}")
-    yolo_model = None
-
-try:
-    print("Loading CNN model...")
-    model = models.resnet50(weights=None)
-    model.fc = torch.nn.Sequential(
-        torch.nn.Linear(model.fc.in_features, 128),
-        torch.nn.ReLU(),
-        torch.nn.Linear(128, 1),
-        torch.nn.Sigmoid()
+# Load models in a background thread (readiness via /readyz) and warm them up on synthetic inputs
+BACKGROUND_STARTUP = os.getenv("BACKGROUND_STARTUP", "1") == "1"
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "2"))
+
+startup_state = {
+    "ready": False,
+    "error": None,
+    "phases_ms": {}
+}
+
+# Maximum number of crops classified in a single CNN forward pass
+CNN_MAX_BATCH_SIZE = int(os.getenv("CNN_MAX_BATCH_SIZE", "32"))
+
+# Cross-request micro-batching: concurrent requests share YOLO / CNN forward passes
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") == "1"
+YOLO_MAX_BATCH_SIZE = int(os.getenv("YOLO_MAX_BATCH_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Inference backend per model: eager | torchscript | onnx | openvino (see export_models.py),
+# plus int8 for the CNN (see quantize_cnn.py)
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "eager")
+CNN_BACKEND = os.getenv("CNN_BACKEND", "eager")
+
+# Spoilage classifier tier from model_registry.py (resnet50, resnet18, mobilenet_v3_large, mobilenet_v3_small)
+spoilage_spec = get_spoilage_model(os.getenv("SPOILAGE_MODEL", "resnet50"))
+SPOILAGE_THRESHOLD = spoilage_spec['threshold']
+
+# Fused detector (train_fused_detector.py): YOLO predicts fresh/rotten itself and the CNN is not loaded.
+# Its rotten scores are centred on 0.5 (see fused_spoilage_scores), hence the separate threshold.
+FUSED_DETECTOR = os.getenv("FUSED_DETECTOR", "0") == "1"
+if FUSED_DETECTOR:
+    SPOILAGE_THRESHOLD = 0.5
+
+def load_with_fallback(name, loader, backend):
+    """Load a model with the configured backend, falling back to eager PyTorch."""
+    try:
+        print(f"Loading {name} model ({backend})...")
+        loaded = loader(backend)
+        print(f"{name} model loaded successfully")
+        return loaded, backend
+    except Exception as e:
+        print(f"Error loading {name} model ({backend}): {e}")
+    if backend != 'eager':
+        return load_with_fallback(name, loader, 'eager')
+    return None, None
+
+
+# OpenCV/NumPy equivalent of Resize + ToTensor + Normalize with the model's input size and stats
+preprocess_crops = CropPreprocessor(
+    spoilage_spec['input_size'], spoilage_spec['mean'], spoilage_spec['std'], max_batch_size=CNN_MAX_BATCH_SIZE
+)
+
+# Preprocessors for reduced crop sizes (adaptive resolution on /ws/video)
+crop_preprocessors = {}
+
+def get_crop_preprocessor(size=None):
+    if size is None or size == spoilage_spec['input_size']:
+        return preprocess_crops
+    if size not in crop_preprocessors:
+        crop_preprocessors[size] = CropPreprocessor(
+            size, spoilage_spec['mean'], spoilage_spec['std'], max_batch_size=CNN_MAX_BATCH_SIZE
+        )
+    return crop_preprocessors[size]
+
+def classify_crops(crops, size=None):
+    """
+    Run the spoilage CNN on a list of BGR crops.
+    Crops are resized into one normalized batch tensor, so each chunk of
+    up to CNN_MAX_BATCH_SIZE crops costs a single forward pass.
+    size overrides the model's input size (eager backend; the CNN pools globally).
+    Returns one spoilage score per crop, in order.
+    """
+    if not crops:
+        return []
+
+    preprocess = get_crop_preprocessor(size)
+    scores = []
+    with torch.no_grad():
+        for start in range(0, len(crops), CNN_MAX_BATCH_SIZE):
+            batch = preprocess(crops[start:start + CNN_MAX_BATCH_SIZE]).to(device)
+            scores.extend(model(batch).view(-1).tolist())
+    return scores
+
+def run_yolo_batch(items):
+    """
+    Run YOLO on a list of (frame, conf) or (frame, conf, imgsz) items, once per
+    distinct input size (a single call unless adaptive resolution mixes sizes).
+    Each call runs at the lowest requested confidence and each item's
+    detections are then filtered by its own threshold.
+    Returns (boxes, confidences, class_ids) numpy arrays per item.
+    """
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(item[2] if len(item) > 2 else None, []).append(i)
+
+    outputs = [None] * len(items)
+    for imgsz, indices in groups.items():
+        frames = [items[i][0] for i in indices]
+        min_conf = min(items[i][1] for i in indices)
+        options = {"imgsz": imgsz} if imgsz else {}
+        results = yolo_model(frames, conf=min_conf, device='cpu', verbose=False, **options)
+        for i, result in zip(indices, results):
+            boxes = result.boxes.xyxy.cpu().numpy()
+            confidences = result.boxes.conf.cpu().numpy()
+            class_ids = result.boxes.cls.cpu().numpy()
+            keep = confidences >= items[i][1]
+            outputs[i] = (boxes[keep], confidences[keep], class_ids[keep])
+    workers.apply_thread_settings()
+    return outputs
+
+def timed_phase(name, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    startup_state["phases_ms"][name] = round(elapsed_ms, 1)
+    print(f"Startup phase {name}: {elapsed_ms:.1f} ms")
+    return result
+
+def warm_up_yolo():
+    frame = np.zeros((640, 640, 3), dtype=np.uint8)
+    for _ in range(WARMUP_ITERATIONS):
+        run_yolo_batch([(frame, 0.5)])
+
+def warm_up_cnn():
+    crops = [np.zeros((96, 96, 3), dtype=np.uint8)] * min(CNN_MAX_BATCH_SIZE, 8)
+    for _ in range(WARMUP_ITERATIONS):
+        classify_crops(crops)
+
+def load_models():
+    global yolo_model, model, YOLO_BACKEND, CNN_BACKEND
+    if FUSED_DETECTOR:
+        yolo_model, YOLO_BACKEND = timed_phase(
+            "load_yolo", load_with_fallback, "Fused YOLO",
+            lambda backend: load_yolo(backend, FUSED_YOLO_WEIGHTS, 'yolo_apple_fused'), YOLO_BACKEND
+        )
+        return
+    yolo_model, YOLO_BACKEND = timed_phase("load_yolo", load_with_fallback, "YOLO", load_yolo, YOLO_BACKEND)
+    model, CNN_BACKEND = timed_phase(
+        "load_cnn", load_with_fallback, "CNN", lambda backend: load_cnn(backend, device, spoilage_spec), CNN_BACKEND
     )
-    model.load_state_dict(torch.load('models/trained/spoilage_cnn.pth', map_location=device))
-    model.eval()
-    model = model.to(device)
-    print("CNN model loaded successfully")
-except Exception as e:
-    print(f"Error loading CNN model: {e}")
-    model = None
-
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-])
+
+# Set by the prefork launcher (serve_prefork.py), which loads the weights once before forking workers
+models_preloaded = False
+
+def preload_models():
+    """Load the models without running them, so forked workers share the weight pages."""
+    global models_preloaded
+    load_models()
+    models_preloaded = True
+
+def startup_models():
+    """Load both models (unless preloaded), optionally warm them up, and mark the service ready."""
+    started = time.perf_counter()
+    try:
+        if not models_preloaded:
+            load_models()
+        if WARMUP and yolo_model is not None:
+            timed_phase("warmup_yolo", warm_up_yolo)
+        if WARMUP and model is not None:
+            timed_phase("warmup_cnn", warm_up_cnn)
+    except Exception as e:
+        print(f"Error during model startup: {e}")
+        startup_state["error"] = str(e)
+
+    startup_state["phases_ms"]["startup_total"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_state["ready"] = (yolo_model is not None and (model is not None or FUSED_DETECTOR)
+                              and startup_state["error"] is None)
+    print(f"Model startup finished in {startup_state['phases_ms']['startup_total']:.1f} ms "
+          f"(ready={startup_state['ready']})")
+
+yolo_batcher = MicroBatcher("yolo", run_yolo_batch, YOLO_MAX_BATCH_SIZE, BATCH_MAX_WAIT_MS)
+cnn_batcher = MicroBatcher("cnn", classify_crops, CNN_MAX_BATCH_SIZE, BATCH_MAX_WAIT_MS)
+
+async def detect_objects(frame, conf):
+    """YOLO detections for one frame, shared with concurrent requests when batching is on."""
+    if INFERENCE_BATCHING:
+        return await yolo_batcher.infer((frame, conf))
+    return (await run_inference(run_yolo_batch, [(frame, conf)]))[0]
+
+async def detect_objects_many(items):
+    """YOLO detections for several (frame, conf) items, run as one batch."""
+    if INFERENCE_BATCHING:
+        return await yolo_batcher.infer_many(items)
+    return await run_inference(run_yolo_batch, items)
+
+# Sliced inference for high-resolution frames (off by default)
+TILED_INFERENCE = os.getenv("TILED_INFERENCE", "0") == "1"
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_MIN_IMAGE_SIZE = int(os.getenv("TILE_MIN_IMAGE_SIZE", "1280"))  # longer side at which tiling starts
+TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", "12"))  # bounds YOLO work per frame
+TILE_FULL_FRAME = os.getenv("TILE_FULL_FRAME", "1") == "1"  # also run the whole frame, for large apples
+TILE_NMS_THRESHOLD = float(os.getenv("TILE_NMS_THRESHOLD", "0.5"))
+
+def use_tiling(frame):
+    return TILED_INFERENCE and max(frame.shape[:2]) >= TILE_MIN_IMAGE_SIZE
+
+def yolo_inputs(frame, conf, imgsz=None):
+    """YOLO items for one frame: the frame itself, or its tiles (plus offsets) when tiling applies."""
+    extra = (imgsz,) if imgsz else ()
+    if not use_tiling(frame):
+        return [(frame, conf) + extra], None
+    height, width = frame.shape[:2]
+    tiles = tile_grid(width, height, TILE_SIZE, TILE_OVERLAP, TILE_MAX_TILES)
+    items = [(frame[y0:y1, x0:x1], conf) + extra for x0, y0, x1, y1 in tiles]
+    offsets = [(x0, y0) for x0, y0, _, _ in tiles]
+    if TILE_FULL_FRAME:
+        items.append((frame, conf) + extra)
+        offsets.append((0, 0))
+    return items, offsets
+
+async def detect_frames(frames, conf, sizes=None):
+    """
+    YOLO detections per frame, with the tiles of every frame in the same batch
+    and merged back per frame (cross-tile NMS) when tiling applies.
+    sizes optionally gives a YOLO input size per frame.
+    """
+    sizes = sizes or [None] * len(frames)
+    plans = [yolo_inputs(frame, conf, imgsz) for frame, imgsz in zip(frames, sizes)]
+    results = await detect_objects_many([item for items, _ in plans for item in items])
+
+    detections = []
+    position = 0
+    for items, offsets in plans:
+        frame_results = results[position:position + len(items)]
+        position += len(items)
+        if offsets is None:
+            detections.append(frame_results[0])
+        else:
+            detections.append(merge_tile_detections(frame_results, offsets, TILE_NMS_THRESHOLD))
+    return detections
+
+# One batcher per reduced crop size, so every CNN batch has a single input shape
+sized_cnn_batchers = {}
+
+def get_cnn_batcher(size=None):
+    if size is None or size == spoilage_spec['input_size']:
+        return cnn_batcher
+    if size not in sized_cnn_batchers:
+        sized_cnn_batchers[size] = MicroBatcher(
+            f"cnn{size}", lambda crops: classify_crops(crops, size), CNN_MAX_BATCH_SIZE, BATCH_MAX_WAIT_MS
+        )
+    return sized_cnn_batchers[size]
+
+async def classify(crops, size=None):
+    """Spoilage scores for a list of BGR crops, batched across requests when enabled."""
+    if not crops:
+        return []
+    if INFERENCE_BATCHING:
+        return await get_cnn_batcher(size).infer_many(crops)
+    return await run_inference(classify_crops, crops, size)
+
+async def spoilage_scores(crops, confidences, class_ids, size=None):
+    """Rotten scores for kept detections: from the fused detector's classes, or the CNN on the crops."""
+    if FUSED_DETECTOR:
+        return fused_spoilage_scores(confidences, class_ids).tolist()
+    return await classify(crops, size)
 
 def simulate_apple_sensor_data(prediction, confidence, box):
 
@@ -205,6 +495,68 @@ def safe_crop_box(box, frame_shape):
 
     return x1, y1, x2, y2
 
+# /detect result cache: "exact" keys on the upload bytes, "phash" on a perceptual hash, "off" disables it
+DETECT_CACHE_MODE = os.getenv("DETECT_CACHE_MODE", "exact")
+detect_cache = DetectionCache(
+    max_entries=int(os.getenv("DETECT_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("DETECT_CACHE_TTL_SECONDS", "300")),
+    max_bytes=int(float(os.getenv("DETECT_CACHE_MAX_MB", "32")) * 1024 * 1024),
+    max_distance=int(os.getenv("DETECT_CACHE_PHASH_DISTANCE", "4"))
+)
+
+async def detect_and_classify_many(frames, conf=0.5):
+    """
+    YOLO + spoilage CNN for several frames: one YOLO batch, then the crops of
+    every frame in one CNN batch (no CNN with the fused detector).
+    Returns, per frame, (raw_box, clamped_box, score) per apple; this is what /detect caches.
+    """
+    detections = await detect_frames(frames, conf)
+
+    # Collect every crop first so the CNN sees them as one batch
+    boxes_per_frame = []
+    crops = []
+    kept_confidences = []
+    kept_class_ids = []
+    for frame, (boxes, confidences, class_ids) in zip(frames, detections):
+        boxes_kept = []
+        for box, confidence, class_id in zip(boxes, confidences, class_ids):
+            x1, y1, x2, y2 = safe_crop_box(box[:4], frame.shape)
+            apple_crop = frame[y1:y2, x1:x2]
+
+            if apple_crop.size == 0:
+                continue
+
+            boxes_kept.append((box, (x1, y1, x2, y2)))
+            crops.append(apple_crop)
+            kept_confidences.append(confidence)
+            kept_class_ids.append(class_id)
+        boxes_per_frame.append(boxes_kept)
+
+    scores = iter(await spoilage_scores(crops, kept_confidences, kept_class_ids))
+    return [[(box, clamped, next(scores)) for box, clamped in boxes_kept] for boxes_kept in boxes_per_frame]
+
+async def detect_and_classify(frame, conf=0.5):
+    """YOLO + spoilage CNN for one frame."""
+    return (await detect_and_classify_many([frame], conf))[0]
+
+def build_detections(classified):
+    """/detect response entries (prediction, sensor data, pricing) for cached or fresh results."""
+    response_data = []
+    for box, (x1, y1, x2, y2), pred in classified:
+        prediction = 'rottenapples' if pred > SPOILAGE_THRESHOLD else 'freshapples'
+
+        sensor_data = simulate_apple_sensor_data(prediction, pred, box)
+        pricing = dynamic_apple_price_engine(prediction, pred, sensor_data)
+
+        response_data.append({
+            "box": [x1, y1, x2, y2],
+            "prediction": prediction,
+            "confidence": pred,
+            "sensor_data": sensor_data,
+            "pricing": pricing
+        })
+    return response_data
+
 @app.post("/detect")
 async def detect_apples(file: UploadFile = File(...)):
     if yolo_model is None:
@@ -214,45 +566,320 @@ async def detect_apples(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload an image.")
     
     contents = await file.read()
-    # Read image to OpenCV
-    nparr = np.frombuffer(contents, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
-    if frame is None:
-        raise HTTPException(status_code=400, detail="Could not decode image")
+    # Resubmitted photos skip YOLO and the CNN; only pricing is recomputed
+    cache_key = content_key(contents) if DETECT_CACHE_MODE == "exact" else None
+    classified = detect_cache.get(cache_key) if cache_key is not None else None
 
-    results = yolo_model(frame, conf=0.5, device='cpu')
-    response_data = []
+    if classified is None:
+        # Read image to OpenCV (off the event loop)
+        frame, release = await run_frame_decode(decode_image, contents)
 
-    for result in results:
-        boxes = result.boxes.xyxy.cpu().numpy()
-        for box in boxes:
-            x1, y1, x2, y2 = safe_crop_box(box[:4], frame.shape)
-            apple_crop = frame[y1:y2, x1:x2]
+        if frame is None:
+            raise HTTPException(status_code=400, detail="Could not decode image")
 
-            if apple_crop.size == 0:
-                continue
+        try:
+            if DETECT_CACHE_MODE == "phash":
+                cache_key = await run_decode(perceptual_hash, frame)
+                classified = detect_cache.get(cache_key)
 
-            apple_crop_rgb = cv2.cvtColor(apple_crop, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(apple_crop_rgb)
+            if classified is None:
+                classified = await detect_and_classify(frame, 0.5)
+                if cache_key is not None:
+                    detect_cache.put(cache_key, classified)
+        finally:
+            frame = None
+            release()
 
-            image_tensor = transform(pil_image).unsqueeze(0).to(device)
-            with torch.no_grad():
-                pred = model(image_tensor).item()
-                prediction = 'rottenapples' if pred > 0.8 else 'freshapples'
+    return {"detections": build_detections(classified)}
 
-            sensor_data = simulate_apple_sensor_data(prediction, pred, box)
-            pricing = dynamic_apple_price_engine(prediction, pred, sensor_data)
+# /detect_batch: images are read, decoded and run through the models a chunk at a time
+DETECT_BATCH_CHUNK = int(os.getenv("DETECT_BATCH_CHUNK", str(YOLO_MAX_BATCH_SIZE)))
+DETECT_BATCH_MAX_IMAGE_MB = float(os.getenv("DETECT_BATCH_MAX_IMAGE_MB", "25"))
+BATCH_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
 
-            response_data.append({
-                "box": [x1, y1, x2, y2],
-                "prediction": prediction,
-                "confidence": pred,
-                "sensor_data": sensor_data,
-                "pricing": pricing
-            })
+def is_zip_upload(upload):
+    return (upload.content_type in ('application/zip', 'application/x-zip-compressed')
+            or (upload.filename or '').lower().endswith('.zip'))
+
+def iter_batch_images(files):
+    """
+    Yield (filename, bytes, error) for every image in the uploads, reading zip
+    archives one member at a time so only the current chunk is held in memory.
+    """
+    max_bytes = DETECT_BATCH_MAX_IMAGE_MB * 1024 * 1024
+    for upload in files:
+        if is_zip_upload(upload):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                yield upload.filename, None, "Invalid zip archive"
+                continue
+            with archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                        continue
+                    if info.file_size > max_bytes:
+                        yield info.filename, None, "Image too large"
+                        continue
+                    yield info.filename, archive.read(info), None
+        elif upload.content_type and upload.content_type.startswith('image/'):
+            yield upload.filename, upload.file.read(), None
+        else:
+            yield upload.filename, None, "Invalid file type. Please upload an image or a zip archive."
+
+async def detect_uploaded_images(chunk, conf=0.5):
+    """
+    Cached or fresh detections for a chunk of (filename, bytes, error) uploads.
+    Cache misses share one YOLO batch and one CNN batch.
+    Returns [filename, classified, error] per upload.
+    """
+    outputs = [[name, None, error] for name, _, error in chunk]
+    to_decode = []
+    for i, (_, contents, error) in enumerate(chunk):
+        if error is not None:
+            continue
+        cache_key = content_key(contents) if DETECT_CACHE_MODE == "exact" else None
+        classified = detect_cache.get(cache_key) if cache_key is not None else None
+        if classified is not None:
+            outputs[i][1] = classified
+        else:
+            to_decode.append((i, contents, cache_key))
+
+    # Every decode finishes before we look at the results, so no shared-memory slot is left unreleased
+    decoded = await asyncio.gather(*(run_frame_decode(decode_image, contents) for _, contents, _ in to_decode),
+                                   return_exceptions=True)
+    decoded = [(None, None) if isinstance(d, BaseException) else d for d in decoded]
+    releases = [release for _, release in decoded if release is not None]
+    misses = []
+    try:
+        for (i, _, cache_key), (frame, _) in zip(to_decode, decoded):
+            if frame is None:
+                outputs[i][2] = "Could not decode image"
+                continue
+            if DETECT_CACHE_MODE == "phash":
+                cache_key = await run_decode(perceptual_hash, frame)
+                classified = detect_cache.get(cache_key)
+                if classified is not None:
+                    outputs[i][1] = classified
+                    continue
+            misses.append((i, frame, cache_key))
+
+        if misses:
+            results = await detect_and_classify_many([frame for _, frame, _ in misses], conf)
+            for (i, _, cache_key), classified in zip(misses, results):
+                outputs[i][1] = classified
+                if cache_key is not None:
+                    detect_cache.put(cache_key, classified)
+    finally:
+        decoded = misses = None
+        for release in releases:
+            release()
+    return outputs
+
+@app.post("/detect_batch")
+async def detect_apples_batch(files: List[UploadFile] = File(...)):
+    """
+    Many images per request, as multipart files and/or zip archives.
+    Streams one NDJSON line per image, in upload order, then a summary line.
+    """
+    if yolo_model is None:
+        raise HTTPException(status_code=503, detail="YOLO model not available. Please check server logs.")
+
+    async def results():
+        started = time.perf_counter()
+        images = iter_batch_images(files)
+        index = errors = apples = 0
+        while True:
+            # Zip members are inflated off the event loop
+            chunk = await asyncio.to_thread(lambda: list(itertools.islice(images, DETECT_BATCH_CHUNK)))
+            if not chunk:
+                break
+            try:
+                outputs = await detect_uploaded_images(chunk, 0.5)
+            except Exception as e:
+                print(f"Error in /detect_batch chunk: {e}")
+                outputs = [[name, None, f"Inference failed: {e}"] for name, _, _ in chunk]
+
+            for filename, classified, error in outputs:
+                line = {"index": index, "filename": filename}
+                if error is not None:
+                    line["error"] = error
+                    errors += 1
+                else:
+                    line["detections"] = build_detections(classified)
+                    apples += len(classified)
+                index += 1
+                yield json.dumps(line) + "\n"
+
+        yield json.dumps({"summary": {
+            "images": index,
+            "errors": errors,
+            "detections": apples,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# /detect_video: recorded footage or a stream URL, decoded server-side a chunk of frames at a time
+VIDEO_INGEST_CHUNK = int(os.getenv("VIDEO_INGEST_CHUNK", str(DETECT_BATCH_CHUNK)))
+VIDEO_INGEST_MAX_UPLOAD_MB = float(os.getenv("VIDEO_INGEST_MAX_UPLOAD_MB", "2048"))
+# Stream URLs make the server connect out, so they are off by default and limited to the
+# listed schemes and camera hosts (host or host:port) when on
+VIDEO_INGEST_ALLOW_URLS = os.getenv("VIDEO_INGEST_ALLOW_URLS", "0") == "1"
+VIDEO_INGEST_URL_SCHEMES = {s.strip().lower() for s in os.getenv("VIDEO_INGEST_URL_SCHEMES", "rtsp,rtsps").split(",") if s.strip()}
+VIDEO_INGEST_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("VIDEO_INGEST_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+def allowed_stream_url(url):
+    """True for a stream URL whose scheme and host (or host:port) are allowlisted."""
+    if not VIDEO_INGEST_ALLOW_URLS or not is_stream_url(url):
+        return False
+    try:
+        parsed = urlsplit(url)
+        host = (parsed.hostname or "").lower()
+        port = parsed.port
+    except ValueError:
+        return False
+    if parsed.scheme.lower() not in VIDEO_INGEST_URL_SCHEMES or not host:
+        return False
+    return host in VIDEO_INGEST_ALLOWED_HOSTS or (port is not None and f"{host}:{port}" in VIDEO_INGEST_ALLOWED_HOSTS)
+
+class CleanupStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs cleanup when it ends, also when the client leaves before the body starts."""
+
+    def __init__(self, content, cleanup, **kwargs):
+        super().__init__(content, **kwargs)
+        self.cleanup = cleanup
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await asyncio.to_thread(self.cleanup)
+
+def spool_video_upload(upload):
+    """Copy an uploaded video to a named temp file (VideoCapture needs a path); returns the path."""
+    max_bytes = VIDEO_INGEST_MAX_UPLOAD_MB * 1024 * 1024
+    suffix = os.path.splitext(upload.filename or '')[1] or '.mp4'
+    written = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as out:
+        try:
+            while True:
+                block = upload.file.read(1024 * 1024)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_bytes:
+                    raise ValueError("Video too large")
+                out.write(block)
+        except Exception:
+            out.close()
+            os.unlink(out.name)
+            raise
+    return out.name
+
+@app.post("/detect_video")
+async def detect_video(file: Optional[UploadFile] = File(None), url: Optional[str] = Form(None),
+                       stride: int = Form(5), start: float = Form(0.0), end: Optional[float] = Form(None),
+                       conf: float = Form(0.5)):
+    """
+    Detection + spoilage for a video file upload or a stream URL, every `stride`-th
+    frame between `start` and `end` seconds. Streams one NDJSON line per processed
+    frame, then a summary line; only one chunk of frames is in memory at a time.
+    """
+    if yolo_model is None:
+        raise HTTPException(status_code=503, detail="YOLO model not available. Please check server logs.")
+    if (file is None) == (url is None):
+        raise HTTPException(status_code=400, detail="Send either a video file or a stream url")
+    if stride < 1 or start < 0 or (end is not None and end <= start):
+        raise HTTPException(status_code=400, detail="Invalid stride or time range")
+
+    temp_path = None
+    if url is not None:
+        if not allowed_stream_url(url):
+            raise HTTPException(status_code=400, detail="Stream url not allowed")
+        source = url
+    else:
+        try:
+            temp_path = await asyncio.to_thread(spool_video_upload, file)
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        source = temp_path
 
-    return {"detections": response_data}
+    try:
+        capture = await asyncio.to_thread(open_video, source)
+    except BaseException as e:
+        # Also on cancellation: the response that would delete the upload never gets created
+        if temp_path is not None:
+            os.unlink(temp_path)
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+
+    frames = iter_video_frames(capture, stride, start, end)
+    # Chunks are read in a worker thread; closing waits for a read still in progress
+    capture_lock = threading.Lock()
+    capture_closed = []
+
+    def read_chunk():
+        with capture_lock:
+            return list(itertools.islice(frames, VIDEO_INGEST_CHUNK))
+
+    def close_video():
+        # Runs from the generator and again when the response ends; only the first call does anything
+        with capture_lock:
+            if capture_closed:
+                return
+            capture_closed.append(True)
+            frames.close()
+            capture.release()
+        if temp_path is not None:
+            os.unlink(temp_path)
+
+    async def results():
+        started = time.perf_counter()
+        info = video_info(capture)
+        processed = errors = apples = rotten = 0
+        last_timestamp_ms = None
+        try:
+            while True:
+                chunk = await asyncio.to_thread(read_chunk)
+                if not chunk:
+                    break
+                try:
+                    outputs = await detect_and_classify_many([frame for _, _, frame in chunk], conf)
+                except Exception as e:
+                    video_tracer.log("video_chunk_error", f"Error in /detect_video chunk: {e}")
+                    outputs = [None] * len(chunk)
+
+                for (frame_index, timestamp_ms, _), classified in zip(chunk, outputs):
+                    line = {"frame_index": frame_index, "timestamp_ms": timestamp_ms}
+                    if classified is None:
+                        line["error"] = "Inference failed"
+                        errors += 1
+                    else:
+                        line["detections"] = build_detections(classified)
+                        apples += len(classified)
+                        rotten += sum(pred > SPOILAGE_THRESHOLD for _, _, pred in classified)
+                    processed += 1
+                    last_timestamp_ms = timestamp_ms
+                    yield json.dumps(line) + "\n"
+
+            yield json.dumps({"summary": dict(
+                info,
+                frames_processed=processed,
+                errors=errors,
+                detections=apples,
+                rotten=rotten,
+                stride=stride,
+                last_timestamp_ms=last_timestamp_ms,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+            )}) + "\n"
+        finally:
+            await asyncio.to_thread(close_video)
+
+    # The temp file and capture are released even if the client disconnects before streaming starts
+    return CleanupStreamingResponse(results(), close_video, media_type="application/x-ndjson")
 
 def deterministic_seed_from_sku(sku: str):
     hash_bytes = hashlib.md5(sku.encode()).digest()
@@ -393,6 +1020,76 @@ def generate_explanation_message(spoilage_data, prediction, probability):
     )
 
 
+# /agent_results: results posted in batches by ingest_agent.py running on an aisle's edge box
+AGENT_RESULTS_MAX_CAMERAS = int(os.getenv("AGENT_RESULTS_MAX_CAMERAS", "256"))
+agent_results = OrderedDict()  # camera_id -> latest priced result, least recently updated first
+
+class AgentDetection(BaseModel):
+    box: conlist(int, min_length=4, max_length=4)
+    confidence: float
+    score: float
+    prediction: Literal['freshapples', 'rottenapples']
+
+class AgentResult(BaseModel):
+    camera_id: str
+    frame_index: int
+    timestamp: float
+    width: Optional[int] = None
+    height: Optional[int] = None
+    detections: List[AgentDetection] = []
+    error: Optional[str] = None
+
+class AgentResultsBatch(BaseModel):
+    agent_id: Optional[str] = None
+    results: List[AgentResult]
+
+def price_agent_detection(detection):
+    """Sensor data and pricing for a detection the agent already classified; its prediction and scores are kept."""
+    box = list(detection.box)
+    sensor_data = simulate_apple_sensor_data(detection.prediction, detection.score, box)
+    return {
+        "box": box,
+        "prediction": detection.prediction,
+        "confidence": detection.confidence,
+        "score": detection.score,
+        "sensor_data": sensor_data,
+        "pricing": dynamic_apple_price_engine(detection.prediction, detection.score, sensor_data)
+    }
+
+@app.post("/agent_results")
+async def receive_agent_results(payload: AgentResultsBatch):
+    """Keep the latest result per camera from an ingestion agent, with sensor data and pricing filled in."""
+    accepted = 0
+    for result in payload.results:
+        latest = agent_results.get(result.camera_id)
+        if latest is not None and result.timestamp < latest["timestamp"]:
+            continue  # older than what we have (workers finish batches out of order)
+        agent_results[result.camera_id] = {
+            "agent_id": payload.agent_id,
+            "camera_id": result.camera_id,
+            "frame_index": result.frame_index,
+            "timestamp": result.timestamp,
+            "received_at": time.time(),
+            "width": result.width,
+            "height": result.height,
+            "detections": [price_agent_detection(d) for d in result.detections],
+        }
+        if result.error is not None:
+            agent_results[result.camera_id]["error"] = result.error
+        agent_results.move_to_end(result.camera_id)
+        while len(agent_results) > AGENT_RESULTS_MAX_CAMERAS:
+            agent_results.popitem(last=False)
+        accepted += 1
+    return {"accepted": accepted, "cameras": len(agent_results)}
+
+@app.get("/agent_results")
+async def latest_agent_results(camera_id: Optional[str] = None):
+    if camera_id is not None:
+        if camera_id not in agent_results:
+            raise HTTPException(status_code=404, detail=f"No results for camera {camera_id}")
+        return agent_results[camera_id]
+    return {"cameras": list(agent_results.values())}
+
 @app.post("/predict_milk_spoilage")
 async def predict_milk_spoilage(sku: str = "whole_milk_1gal"):
     if sku not in ['whole_milk_1gal', 'skim_milk_1gal', 'lowfat_milk_1gal', 'uht_milk_1qt']:
@@ -419,120 +1116,496 @@ async def root():
         "message": "ResQCart API is running",
         "endpoints": {
             "/detect": "POST - Upload an image to detect and analyze apples",
+            "/detect_batch": "POST - Upload many images or zip archives; streams NDJSON results per image",
+            "/detect_video": "POST - Upload a video (or send a stream url); streams NDJSON results per sampled frame",
+            "/agent_results": "POST - Batched results from ingest_agent.py; GET - latest result per camera",
             "/predict_milk_spoilage": "POST - Analyze milk spoilage based on SKU",
-            "/ws/video": "WebSocket - Real-time video prediction"
+            "/ws/video": "WebSocket - Real-time video prediction",
+            "/inference_stats": "GET - Inference batcher and /detect cache stats",
+            "/debug/video_traces": "GET - Sampled per-stage timings of /ws/video frames",
+            "/healthz": "GET - Liveness probe",
+            "/readyz": "GET - Readiness probe (models loaded and warmed up)"
         },
         "status": {
             "yolo_model_loaded": yolo_model is not None,
-            "cnn_model_loaded": model is not None
+            "cnn_model_loaded": model is not None,
+            "yolo_backend": YOLO_BACKEND,
+            "cnn_backend": CNN_BACKEND,
+            "spoilage_model": "fused" if FUSED_DETECTOR else spoilage_spec['name']
+        }
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and the event loop is serving requests."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: both models are loaded (and warmed up, if enabled)."""
+    if startup_state["ready"]:
+        status = "ready"
+    elif "startup_total" in startup_state["phases_ms"]:
+        status = "failed"
+    else:
+        status = "loading"
+    body = {
+        "status": status,
+        "yolo_model_loaded": yolo_model is not None,
+        "cnn_model_loaded": model is not None,
+        "startup_phases_ms": startup_state["phases_ms"]
+    }
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
+    return JSONResponse(body, status_code=200 if startup_state["ready"] else 503)
+
+@app.get("/inference_stats")
+async def inference_stats():
+    return {
+        "batching_enabled": INFERENCE_BATCHING,
+        "yolo": yolo_batcher.stats(),
+        "cnn": cnn_batcher.stats(),
+        **{batcher.name: batcher.stats() for batcher in sized_cnn_batchers.values()},
+        "detect_cache": dict(detect_cache.stats(), mode=DETECT_CACHE_MODE),
+        "threads": workers.thread_settings(),
+        "decode": workers.decode_stats(),
+        "video_scheduler": manager.scheduler.stats(),
+        "video_streams": [session.stats() for session in manager.sessions.values()]
+    }
+
+# Multi-object tracking on /ws/video: stable track IDs, and the CNN only runs on new
+# tracks and every TRACK_REFRESH_FRAMES frames, with scores smoothed per track
+VIDEO_TRACKING = os.getenv("VIDEO_TRACKING", "1") == "1"
+TRACK_HIGH_CONFIDENCE = float(os.getenv("TRACK_HIGH_CONFIDENCE", "0.25"))
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_MAX_AGE = int(os.getenv("TRACK_MAX_AGE", "30"))
+TRACK_REFRESH_FRAMES = int(os.getenv("TRACK_REFRESH_FRAMES", "30"))
+TRACK_SCORE_SMOOTHING = float(os.getenv("TRACK_SCORE_SMOOTHING", "0.3"))
+
+def new_tracker():
+    if not VIDEO_TRACKING:
+        return None
+    return IoUTracker(
+        high_confidence=TRACK_HIGH_CONFIDENCE,
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_age=TRACK_MAX_AGE,
+        refresh_frames=TRACK_REFRESH_FRAMES,
+        smoothing=TRACK_SCORE_SMOOTHING
+    )
+
+# Scene-change gate on /ws/video: a frame whose thumbnail barely differs from the last
+# processed one reuses that result instead of running YOLO/CNN (static shelf cameras).
+# SCENE_CHANGE_THRESHOLD is the fraction of thumbnail pixels that must change by more
+# than SCENE_PIXEL_DELTA gray levels; SCENE_REFRESH_FRAMES forces a real pass regardless
+SCENE_GATE = os.getenv("SCENE_GATE", "1") == "1"
+SCENE_CHANGE_THRESHOLD = float(os.getenv("SCENE_CHANGE_THRESHOLD", "0.02"))
+SCENE_PIXEL_DELTA = int(os.getenv("SCENE_PIXEL_DELTA", "12"))
+SCENE_REFRESH_FRAMES = int(os.getenv("SCENE_REFRESH_FRAMES", "30"))
+
+def new_scene_gate():
+    if not SCENE_GATE:
+        return None
+    return SceneChangeGate(
+        threshold=SCENE_CHANGE_THRESHOLD,
+        pixel_delta=SCENE_PIXEL_DELTA,
+        refresh_frames=SCENE_REFRESH_FRAMES
+    )
+
+# /ws/video frames at least twice the YOLO input size on both sides are decoded at 1/2, 1/4
+# or 1/8 resolution (JPEG scales while decoding); off when tiling needs full resolution
+WS_REDUCED_DECODE = os.getenv("WS_REDUCED_DECODE", "1") == "1"
+
+def ws_yolo_frame(frame, size=640):
+    """The image YOLO and the crops use on /ws/video, and the factors mapping it to 640x640 space."""
+    if use_tiling(frame):
+        # Detect and crop on full-resolution tiles; boxes are still reported in 640x640 space
+        frame_resized = frame
+    else:
+        # Resize frame to size x size for YOLO (640 unless adaptive resolution stepped down)
+        frame_resized = cv2.resize(frame, (size, size))
+    return frame_resized, 640 / frame_resized.shape[1], 640 / frame_resized.shape[0]
+
+async def prepare_ws_frame(item, session):
+    """
+    Decode one /ws/video frame. Returns (frame, None) when it needs the models,
+    or (None, message) when it is settled already (message None sends nothing).
+    """
+    trace = item["trace"]
+    if trace is not None:
+        trace.add("queue", (time.perf_counter() - item["received_at"]) * 1000)
+    # Frames are squeezed to the YOLO input size, so big images can be decoded at reduced
+    # resolution; tiling needs the full-resolution frame
+    target_size = None
+    if WS_REDUCED_DECODE and not TILED_INFERENCE:
+        target_size = session.resolution.yolo_size if session.resolution is not None else 640
+    try:
+        (frame, decode_ms), item["release"] = await run_frame_decode(*item["decode"], target_size)
+    except Exception as e:
+        # Bad base64 or image data only fails this camera's frame, not the round
+        video_tracer.log("decode_error", f"Could not decode frame from {session.camera_id}: {e}")
+        return None, {
+            "type": "error",
+            "message": f"Could not decode frame: {e}"
         }
+    if trace is not None:
+        for stage, ms in decode_ms.items():
+            trace.add(stage, ms)
+        trace.fields["shape"] = list(frame.shape) if frame is not None else None
+
+    if frame is None:
+        return None, None
+    if yolo_model is None:
+        video_tracer.log("yolo_unavailable", "YOLO model not available")
+        return None, {
+            "type": "error",
+            "message": "YOLO model not available"
+        }
+
+    gate = session.scene_gate
+    if gate is not None:
+        with timed(trace, "gate"):
+            signature = await run_decode(frame_signature, frame)
+            unchanged = not gate.should_process(signature)
+        if unchanged and session.last_result is not None:
+            # Static scene: resend the last detections under this frame's number
+            return None, dict(session.last_result, frame_count=item["frame_count"],
+                              timestamp=datetime.datetime.now().isoformat(), scene_unchanged=True)
+    return frame, None
+
+def collect_ws_detections(session, frame_resized, scale_x, scale_y, boxes, confidences, class_ids):
+    """Detections for one frame after tracking, with the crops that still need a spoilage score."""
+    detections = []
+    crops = []
+    kept = []
+
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = safe_crop_box(box[:4], frame_resized.shape)
+        confidence = float(confidences[i])
+        class_id = int(class_ids[i])
+
+        # Get class name (assuming apple detection; every fused class is an apple)
+        class_name = "apple" if class_id == 0 or FUSED_DETECTOR else f"object_{class_id}"
+
+        # Crop detected object for further analysis (BGR, like /detect)
+        object_crop = frame_resized[y1:y2, x1:x2]
+        if object_crop.size > 0:
+            crops.append(object_crop)
+            kept.append(i)
+            detections.append({
+                "box": [round(x1 * scale_x), round(y1 * scale_y),
+                        round(x2 * scale_x), round(y2 * scale_y)],
+                "class": class_name,
+                "confidence": confidence,
+                "prediction": 'unknown',
+                "timestamp": datetime.datetime.now().isoformat()
+            })
+
+    tracks = None
+    tracker = session.tracker
+    if tracker is not None:
+        tracks = tracker.update([d["box"] for d in detections], confidences[kept])
+        # Low-confidence boxes that continue no track are dropped, as in ByteTrack
+        tracked = [j for j, track in enumerate(tracks) if track is not None]
+        detections = [detections[j] for j in tracked]
+        crops = [crops[j] for j in tracked]
+        kept = [kept[j] for j in tracked]
+        tracks = [tracks[j] for j in tracked]
+        for detection, track in zip(detections, tracks):
+            detection["track_id"] = track.track_id
+        # Fused scores come free with the detection, so every frame feeds the average
+        to_classify = [j for j, track in enumerate(tracks) if FUSED_DETECTOR or tracker.needs_classification(track)]
+    else:
+        to_classify = list(range(len(detections)))
+
+    return {
+        "detections": detections,
+        "tracks": tracks,
+        "crops": [crops[j] for j in to_classify],
+        "confidences": confidences[[kept[j] for j in to_classify]],
+        "class_ids": class_ids[[kept[j] for j in to_classify]],
+        "to_classify": to_classify,
+    }
+
+def apply_ws_scores(session, collected, scores):
+    tracker = session.tracker
+    detections, tracks = collected["detections"], collected["tracks"]
+    for j, pred in zip(collected["to_classify"], scores):
+        if tracker is not None:
+            tracker.record_score(tracks[j], pred)
+        else:
+            detections[j]["prediction"] = 'rotten' if pred > SPOILAGE_THRESHOLD else 'fresh'
+    if tracker is not None:
+        for detection, track in zip(detections, tracks):
+            if track.score is not None:
+                detection["prediction"] = 'rotten' if track.score > SPOILAGE_THRESHOLD else 'fresh'
+
+async def process_ws_frames(batch):
+    """
+    Run one scheduler round of /ws/video frames, [(item, session)] from different
+    cameras: one YOLO batch for every frame and one CNN batch for every crop
+    that needs a score. Returns the message for each client (None sends nothing).
+    """
+    prepared = await asyncio.gather(*(prepare_ws_frame(item, session) for item, session in batch),
+                                    return_exceptions=True)
+    for i, outcome in enumerate(prepared):
+        if isinstance(outcome, BaseException):
+            # Only the camera whose frame failed gets the error
+            video_tracer.log("prepare_error", f"Error preparing frame: {outcome}")
+            prepared[i] = (None, {"type": "error", "message": f"Processing error: {str(outcome)}"})
+    responses = [response for _, response in prepared]
+    runnable = [i for i, (frame, _) in enumerate(prepared) if frame is not None]
+    if not runnable:
+        return responses
+
+    traces = [batch[i][0]["trace"] for i in runnable]
+    # Adaptive resolution: each camera's current YOLO input and CNN crop sizes (None = defaults)
+    controllers = [batch[i][1].resolution for i in runnable]
+    yolo_sizes = [c.yolo_size if c is not None else None for c in controllers]
+    cnn_sizes = [c.cnn_size if c is not None else None for c in controllers]
+    try:
+        inputs = []
+        yolo_frames = []
+        for i, trace, yolo_size in zip(runnable, traces, yolo_sizes):
+            with timed(trace, "resize"):
+                frame_inputs = ws_yolo_frame(prepared[i][0], yolo_size or 640)
+                # (Optional) Convert to RGB if your YOLO model expects RGB
+                yolo_frames.append(cv2.cvtColor(frame_inputs[0], cv2.COLOR_BGR2RGB))
+            inputs.append(frame_inputs)
+
+        started = time.perf_counter()
+        results = await detect_frames(yolo_frames, 0.2, yolo_sizes)
+        add_stage(traces, "yolo", (time.perf_counter() - started) * 1000)
+
+        collected = []
+        for i, trace, frame_inputs, result in zip(runnable, traces, inputs, results):
+            with timed(trace, "crops"):
+                collected.append(collect_ws_detections(batch[i][1], *frame_inputs, *result))
+
+        # Classify the crops of all cameras that need it in one batched pass per crop size
+        try:
+            started = time.perf_counter()
+            by_size = {}
+            for k, size in enumerate(cnn_sizes):
+                by_size.setdefault(size, []).append(k)
+            size_scores = await asyncio.gather(*(
+                spoilage_scores([crop for k in ks for crop in collected[k]["crops"]],
+                                np.concatenate([collected[k]["confidences"] for k in ks]),
+                                np.concatenate([collected[k]["class_ids"] for k in ks]), size)
+                for size, ks in by_size.items()
+            ))
+            add_stage(traces, "cnn", (time.perf_counter() - started) * 1000)
+            for ks, scores in zip(by_size.values(), size_scores):
+                position = 0
+                for k in ks:
+                    c = collected[k]
+                    apply_ws_scores(batch[runnable[k]][1], c, scores[position:position + len(c["crops"])])
+                    position += len(c["crops"])
+        except Exception as e:
+            video_tracer.log("cnn_error", f"Error in CNN prediction: {e}")
+
+        for i, c, controller in zip(runnable, collected, controllers):
+            item, session = batch[i]
+            session.last_result = {
+                "type": "detection_results",
+                "detections": c["detections"],
+                "frame_count": item["frame_count"],
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            if controller is not None:
+                # The sizes this result was computed at (reused results keep theirs)
+                session.last_result["resolution"] = controller.current()
+            responses[i] = dict(session.last_result)
+
+    except Exception as e:
+        video_tracer.log("yolo_error", f"Error in YOLO processing: {e}")
+        for i in runnable:
+            session = batch[i][1]
+            if session.scene_gate is not None:
+                # Don't let a failed frame become the reference the next frames are skipped against
+                session.scene_gate.reset()
+            responses[i] = {
+                "type": "error",
+                "message": f"Processing error: {str(e)}"
+            }
+    return responses
+
+async def serve_video_round(batch):
+    """Scheduler callback: process a round and send each camera its result."""
+    started_at = time.perf_counter()
+    try:
+        responses = await process_ws_frames(batch)
+    except Exception as e:
+        video_tracer.log("round_error", f"Error processing frames: {e}")
+        responses = [{"type": "error", "message": f"Processing error: {str(e)}"}] * len(batch)
+    finally:
+        # Results hold no pixels; the decoded frames (shared-memory slots with DECODE_POOL=shm) can go
+        for item, _ in batch:
+            item.pop("release", lambda: None)()
+
+    async def send(item, session, response):
+        trace = item["trace"]
+        if response is None:
+            video_tracer.finish(trace, result="none")
+            return
+        latency_ms = session.frame_done(item["received_at"], started_at)
+        if response["type"] == "detection_results":
+            response["latency_ms"] = round(latency_ms, 1)
+            response["dropped_frames"] = session.mailbox.dropped
+            if session.scene_gate is not None:
+                response["skipped_ratio"] = session.scene_gate.stats()["skip_ratio"]
+            if session.resolution is not None and not response.get("scene_unchanged"):
+                session.resolution.observe(latency_ms, manager.scheduler.queue_depth())
+        try:
+            with timed(trace, "send"):
+                if response["type"] == "detection_results":
+                    await session.send_result(response)
+                else:
+                    await session.send_json(response)
+        except Exception as e:
+            # The camera may have disconnected while its frame was in the round
+            video_tracer.log("send_error", f"Could not send video result: {e}")
+        if trace is not None:
+            video_tracer.finish(trace, result=response["type"], detections=len(response.get("detections", [])),
+                                scene_unchanged=bool(response.get("scene_unchanged")))
+
+    await asyncio.gather(*(send(item, session, response) for (item, session), response in zip(batch, responses)))
+
+# Shared /ws/video scheduler: fair queuing across cameras, per-camera FPS caps and
+# cross-camera batching. Cameras named in VIDEO_PRIORITY_CAMERAS (the camera_id query
+# parameter) get VIDEO_PRIORITY_WEIGHT times the share of the others when the node is busy
+VIDEO_SCHEDULER_BATCH = int(os.getenv("VIDEO_SCHEDULER_BATCH", "8"))  # frames (cameras) per round
+VIDEO_SCHEDULER_IN_FLIGHT = int(os.getenv("VIDEO_SCHEDULER_IN_FLIGHT", "2"))
+VIDEO_MAX_FPS = float(os.getenv("VIDEO_MAX_FPS", "0"))  # per camera; 0 = uncapped
+VIDEO_PRIORITY_CAMERAS = {c.strip() for c in os.getenv("VIDEO_PRIORITY_CAMERAS", "").split(",") if c.strip()}
+VIDEO_PRIORITY_WEIGHT = float(os.getenv("VIDEO_PRIORITY_WEIGHT", "4"))
+
+manager.scheduler = VideoScheduler(serve_video_round, VIDEO_SCHEDULER_BATCH, VIDEO_SCHEDULER_IN_FLIGHT,
+                                   log=lambda message: video_tracer.log("scheduler_error", message))
+
+# Per-stage timing of one /ws/video frame in VIDEO_TRACE_SAMPLE_EVERY per connection (0 = off),
+# kept in a VIDEO_TRACE_BUFFER ring for /debug/video_traces. Stdout gets a summary line and
+# error messages at most once per VIDEO_LOG_INTERVAL_SECONDS
+video_tracer = VideoTracer(
+    sample_every=int(os.getenv("VIDEO_TRACE_SAMPLE_EVERY", "10")),
+    capacity=int(os.getenv("VIDEO_TRACE_BUFFER", "512")),
+    log_interval_s=float(os.getenv("VIDEO_LOG_INTERVAL_SECONDS", "10"))
+)
+
+@app.get("/debug/video_traces")
+async def video_traces(camera_id: Optional[str] = None, limit: int = 50):
+    """Stage timing percentiles over the buffered /ws/video traces, plus the most recent traces."""
+    return {
+        "summary": video_tracer.summary(camera_id),
+        "traces": video_tracer.recent(camera_id, limit)
     }
 
+# Adaptive resolution (off by default): per camera, step the YOLO input size and CNN crop
+# size down when latency exceeds VIDEO_LATENCY_BUDGET_MS (or ?latency_budget_ms=) or more
+# than a round of frames is queued, and back up when there is headroom
+ADAPTIVE_RESOLUTION = os.getenv("ADAPTIVE_RESOLUTION", "0") == "1"
+VIDEO_LATENCY_BUDGET_MS = float(os.getenv("VIDEO_LATENCY_BUDGET_MS", "250"))
+ADAPTIVE_YOLO_SIZES = parse_sizes(os.getenv("ADAPTIVE_YOLO_SIZES", "320,480,640"))  # multiples of 32
+ADAPTIVE_CNN_SIZES = parse_sizes(os.getenv("ADAPTIVE_CNN_SIZES", "160,192,224"))
+ADAPTIVE_HOLD_FRAMES = int(os.getenv("ADAPTIVE_HOLD_FRAMES", "10"))
+
+def new_resolution_controller(websocket: WebSocket):
+    if not ADAPTIVE_RESOLUTION:
+        return None
+    # Only backends that accept other input shapes can step; the rest keep the exported size
+    yolo_sizes = ADAPTIVE_YOLO_SIZES if YOLO_BACKEND in ("eager", "onnx", "openvino") else (640,)
+    cnn_input = spoilage_spec['input_size']
+    cnn_sizes = tuple(size for size in ADAPTIVE_CNN_SIZES if size <= cnn_input)
+    if CNN_BACKEND != "eager" or FUSED_DETECTOR or not cnn_sizes:
+        cnn_sizes = (cnn_input,)
+    try:
+        budget_ms = float(websocket.query_params.get("latency_budget_ms", VIDEO_LATENCY_BUDGET_MS))
+    except ValueError:
+        budget_ms = VIDEO_LATENCY_BUDGET_MS
+    return ResolutionController(yolo_sizes or (640,), cnn_sizes, budget_ms=budget_ms,
+                                max_queue=VIDEO_SCHEDULER_BATCH, hold_frames=ADAPTIVE_HOLD_FRAMES)
+
+def video_schedule(websocket: WebSocket):
+    """Scheduling settings for a connection: ?camera_id=...&max_fps=... (a client may only lower the cap)."""
+    camera_id = websocket.query_params.get("camera_id") or f"camera-{id(websocket):x}"
+    weight = VIDEO_PRIORITY_WEIGHT if camera_id in VIDEO_PRIORITY_CAMERAS else 1.0
+    max_fps = VIDEO_MAX_FPS
+    try:
+        requested = float(websocket.query_params.get("max_fps", 0))
+    except ValueError:
+        requested = 0
+    if requested > 0:
+        max_fps = min(max_fps, requested) if max_fps else requested
+    return {"camera_id": camera_id, "weight": weight, "max_fps": max_fps}
+
+async def video_receive_loop(session):
+    """Read messages as fast as they arrive; frames only replace the one waiting in the mailbox."""
+    websocket = session.websocket
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        received_at = time.perf_counter()
+
+        if message.get("bytes") is not None:
+            # Binary protocol: header + raw JPEG/WebP, decoded straight from the message buffer
+            try:
+                frame_count, image_format, payload = parse_frame_message(message["bytes"])
+            except ValueError as e:
+                await session.send_json({"type": "error", "message": str(e)})
+                continue
+            frame_data = {"type": "frame", "frame_count": frame_count}
+            decode_args = (decode_image_timed, payload)
+            json_ms = None
+        else:
+            # Receive base64 encoded frame from client
+            data = message["text"]
+            frame_data = json.loads(data)
+            json_ms = (time.perf_counter() - received_at) * 1000
+            image_format = "base64"
+            payload = frame_data.get("frame")
+            if frame_data.get("type") == "frame" and (not isinstance(payload, str) or not payload):
+                await session.send_json({"type": "error", "message": "Frame message needs a base64 'frame' string"})
+                continue
+            decode_args = (decode_base64_image_timed, payload)
+
+        if frame_data.get("type") == "frame":
+            frame_count = frame_data.get("frame_count", 0)
+            trace = video_tracer.start(session.camera_id, frame_count, session.frames_received, received_at)
+            if trace is not None:
+                trace.fields.update(bytes=len(payload), format=image_format)
+                if json_ms is not None:
+                    trace.add("json", json_ms)
+                trace.add("receive", (time.perf_counter() - received_at) * 1000 - (json_ms or 0.0))
+            # Decoding happens when the scheduler takes the frame, so dropped frames are never decoded
+            session.frame_received({
+                "frame_count": frame_count,
+                "decode": decode_args,
+                "received_at": received_at,
+                "trace": trace
+            })
+            manager.scheduler.notify()
+
+        elif frame_data.get("type") == "ping":
+            # Keep connection alive
+            await session.send_json({"type": "pong"})
+
+        elif frame_data.get("type") == "snapshot" and session.result_encoder is not None:
+            # Delta clients resync: the next result lists every detection
+            session.result_encoder.request_snapshot()
+
 @app.websocket("/ws/video")
 async def websocket_video_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    session = manager.open_session(websocket)
     print("WebSocket connection accepted")
     try:
-        while True:
-            # Receive base64 encoded frame from client
-            data = await websocket.receive_text()
-            print(f"Got data: {len(data)} chars")
-            frame_data = json.loads(data)
-            # print("Received raw data:", data)
-            # print("Parsed frame_data:", frame_data)
-            
-            if frame_data.get("type") == "frame":
-                print("Got frame!")
-                # Decode base64 frame
-                frame_bytes = base64.b64decode(frame_data["frame"])
-                nparr = np.frombuffer(frame_bytes, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                print(f"Received frame: shape={frame.shape if frame is not None else None}, dtype={frame.dtype if frame is not None else None}")
-                
-                if frame is not None:
-                    if yolo_model is None:
-                        print("YOLO model not available")
-                        await manager.send_personal_message(json.dumps({
-                            "type": "error",
-                            "message": "YOLO model not available"
-                        }), websocket)
-                        continue
-                        
-                    # Resize frame to 640x640 for YOLO
-                    frame_resized = cv2.resize(frame, (640, 640))
-                    # (Optional) Convert to RGB if your YOLO model expects RGB
-                    frame_resized = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-                    
-                    try:
-                        results = yolo_model(frame_resized, conf=0.2, device='cpu')
-                        print(f"YOLO results: {len(results)} detections")
-                        detections = []
-                        
-                        for result in results:
-                            boxes = result.boxes.xyxy.cpu().numpy()
-                            confidences = result.boxes.conf.cpu().numpy()
-                            class_ids = result.boxes.cls.cpu().numpy()
-                            
-                            for i, box in enumerate(boxes):
-                                x1, y1, x2, y2 = safe_crop_box(box[:4], frame.shape)
-                                height, width, _ = frame_resized.shape
-                                x1, y1 = max(0, x1), max(0, y1)
-                                x2, y2 = min(width, x2), min(height, y2)
-                                confidence = float(confidences[i])
-                                class_id = int(class_ids[i])
-                                
-                                # Get class name (assuming apple detection)
-                                class_name = "apple" if class_id == 0 else f"object_{class_id}"
-                                
-                                # Crop detected object for further analysis
-                                if x2 > x1 and y2 > y1:
-                                    object_crop = frame_resized[y1:y2, x1:x2]
-                                    if object_crop.size > 0:
-                                        object_crop_rgb = cv2.cvtColor(object_crop, cv2.COLOR_BGR2RGB)
-                                        pil_image = Image.fromarray(object_crop_rgb)
-                                        
-                                        try:
-                                            image_tensor = transform(pil_image).unsqueeze(0).to(device)
-                                            with torch.no_grad():
-                                                pred = model(image_tensor).item()
-                                                prediction = 'rotten' if pred > 0.8 else 'fresh'
-                                        except Exception as e:
-                                            print(f"Error in CNN prediction: {e}")
-                                            prediction = 'unknown'
-                                        
-                                        detections.append({
-                                            "box": [x1, y1, x2, y2],
-                                            "class": class_name,
-                                            "confidence": confidence,
-                                            "prediction": prediction,
-                                            "timestamp": datetime.datetime.now().isoformat()
-                                        })
-                        
-                        # Send results back to client
-                        response = {
-                            "type": "detection_results",
-                            "detections": detections,
-                            "frame_count": frame_data.get("frame_count", 0),
-                            "timestamp": datetime.datetime.now().isoformat()
-                        }
-                        
-                        await manager.send_personal_message(json.dumps(response), websocket)
-                        
-                    except Exception as e:
-                        print(f"Error in YOLO processing: {e}")
-                        await manager.send_personal_message(json.dumps({
-                            "type": "error",
-                            "message": f"Processing error: {str(e)}"
-                        }), websocket)
-            
-            elif frame_data.get("type") == "ping":
-                # Keep connection alive
-                await manager.send_personal_message(json.dumps({"type": "pong"}), websocket)
-                
+        await video_receive_loop(session)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+    finally:
+        print(f"WebSocket closed: {session.stats()}")
         manager.disconnect(websocket)
 
 @app.post("/process_video_frame")
@@ -543,34 +1616,32 @@ async def process_video_frame(frame_data: dict):
     
     try:
         # Decode base64 frame
-        frame_bytes = base64.b64decode(frame_data["frame"])
-        nparr = np.frombuffer(frame_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame, release = await run_frame_decode(decode_base64_image, frame_data["frame"])
         
         if frame is None:
             raise HTTPException(status_code=400, detail="Could not decode frame")
         
-        # Process with YOLO
-        results = yolo_model(frame, conf=0.5, device='cpu')
+        # Process with YOLO (tiled for high-resolution frames when enabled)
+        try:
+            boxes, confidences, class_ids = (await detect_frames([frame], 0.5))[0]
+            frame_shape = frame.shape
+        finally:
+            frame = None
+            release()
         detections = []
-        
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            confidences = result.boxes.conf.cpu().numpy()
-            class_ids = result.boxes.cls.cpu().numpy()
-            
-            for i, box in enumerate(boxes):
-                x1, y1, x2, y2 = safe_crop_box(box[:4], frame.shape)
-                confidence = float(confidences[i])
-                class_id = int(class_ids[i])
-                class_name = "apple" if class_id == 0 else f"object_{class_id}"
-                
-                detections.append({
-                    "box": [x1, y1, x2, y2],
-                    "class": class_name,
-                    "confidence": confidence,
-                    "timestamp": datetime.datetime.now().isoformat()
-                })
+
+        for i, box in enumerate(boxes):
+            x1, y1, x2, y2 = safe_crop_box(box[:4], frame_shape)
+            confidence = float(confidences[i])
+            class_id = int(class_ids[i])
+            class_name = "apple" if class_id == 0 or FUSED_DETECTOR else f"object_{class_id}"
+
+            detections.append({
+                "box": [x1, y1, x2, y2],
+                "class": class_name,
+                "confidence": confidence,
+                "timestamp": datetime.datetime.now().isoformat()
+            })
         
         return {
             "detections": detections,
@@ -583,7 +1654,6 @@ async def process_video_frame(frame_data: dict):
 
 """ for resq cart -> route optimization to nearby ngo's"""
 
-load_dotenv()
 API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 # Don't raise error if API key is not available - we'll provide mock data instead
 
@@ -865,3 +1935,6 @@ def get_route(req: RouteRequest):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting route: {str(e)}")
+
+startup_state["phases_ms"]["import"] = round((time.perf_counter() - _import_started) * 1000, 1)
+print(f"Startup phase import: {startup_state['phases_ms']['import']:.1f} ms")
@@ -0,0 +1,181 @@
+""" Sweep worker processes x torch threads against a /detect workload.
+    Each combination starts serve_prefork.py with the detect cache off, replays
+    the dataset images through POST /detect at a fixed client concurrency and
+    records throughput and latency percentiles. The table shows the tradeoff;
+    the recommendation is the highest throughput whose p95 fits --p95-budget-ms
+    (or the overall highest throughput when no budget is given).
+
+    usage: python autotune_threads.py [--workers 1 2 4] [--threads 1 2 4] [--pin]
+                                      [--requests 60] [--concurrency 8] [--p95-budget-ms 500]
+"""
+import argparse
+import glob
+import mimetypes
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+
+
+def powers_of_two(limit):
+    values, n = [], 1
+    while n <= limit:
+        values.append(n)
+        n *= 2
+    return values
+
+
+def load_images(root):
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(root, '**', pattern), recursive=True))
+    if not paths:
+        raise SystemExit(f"No images found under {root}/")
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read(), mimetypes.guess_type(path)[0] or 'image/jpeg'))
+    return images
+
+
+def start_server(workers, threads, pin, port):
+    cmd = [sys.executable, 'serve_prefork.py', '--workers', str(workers), '--threads', str(threads),
+           '--port', str(port), '--host', '127.0.0.1', '--log-level', 'warning']
+    if pin:
+        cmd.append('--pin')
+    # Every request must reach the models, and a worker only accepts once it is warmed up
+    env = dict(os.environ, DETECT_CACHE_MODE='off', BACKGROUND_STARTUP='0')
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(url, server, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if requests.get(f"{url}/readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def run_load(url, images, total, concurrency):
+    """POST total /detect requests from `concurrency` clients; returns (latencies_ms, errors, wall_s)."""
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies, errors = [], 0
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            name, data, content_type = images[i % len(images)]
+            started = time.perf_counter()
+            try:
+                ok = session.post(f"{url}/detect", files={'file': (name, data, content_type)}, timeout=120).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description="Find the worker x torch-thread split with the best /detect throughput")
+    parser.add_argument('--workers', nargs='+', type=int, default=powers_of_two(cpus))
+    parser.add_argument('--threads', nargs='+', type=int, default=powers_of_two(cpus))
+    parser.add_argument('--oversubscribe', action='store_true', help="also try workers x threads > CPUs")
+    parser.add_argument('--pin', action='store_true', help="pin each worker to its own CPU slice")
+    parser.add_argument('--data', default='dataset')
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--warmup-requests', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--p95-budget-ms', type=float)
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    images = load_images(args.data)
+    url = f"http://127.0.0.1:{args.port}"
+    combos = [(w, t) for w in args.workers for t in args.threads if args.oversubscribe or w * t <= cpus]
+    if not combos:
+        raise SystemExit(f"No combination fits {cpus} CPUs (use --oversubscribe)")
+
+    print(f"{cpus} CPUs, {len(images)} images, {args.requests} requests at concurrency {args.concurrency}"
+          f"{', pinned' if args.pin else ''}")
+    print(f"{'workers':>7} {'threads':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results = []
+    for workers, threads in combos:
+        server = start_server(workers, threads, args.pin, args.port)
+        try:
+            wait_ready(url, server, args.startup_timeout)
+            run_load(url, images, args.warmup_requests, args.concurrency)
+            latencies, errors, wall = run_load(url, images, args.requests, args.concurrency)
+        except RuntimeError as e:
+            print(f"{workers:>7} {threads:>7}  failed: {e}")
+            continue
+        finally:
+            stop_server(server)
+
+        if not latencies:
+            print(f"{workers:>7} {threads:>7}  all {errors} requests failed")
+            continue
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        row = {"workers": workers, "threads": threads, "rps": len(latencies) / wall,
+               "p50": p50, "p95": p95, "p99": p99, "errors": errors}
+        results.append(row)
+        print(f"{workers:>7} {threads:>7} {row['rps']:>8.2f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>6}")
+
+    if not results:
+        raise SystemExit("No combination completed")
+    candidates = [r for r in results if r["errors"] == 0 and (args.p95_budget_ms is None or r["p95"] <= args.p95_budget_ms)]
+    if not candidates:
+        print(f"\nNo error-free combination meets p95 <= {args.p95_budget_ms} ms; picking the lowest p95")
+        best = min(results, key=lambda r: r["p95"])
+    else:
+        best = max(candidates, key=lambda r: r["rps"])
+    fastest = min(results, key=lambda r: r["p50"])
+
+    print(f"\nRecommended: {best['workers']} workers x {best['threads']} threads "
+          f"({best['rps']:.2f} req/s, p95 {best['p95']:.1f} ms)")
+    print(f"  python serve_prefork.py --workers {best['workers']} --threads {best['threads']}"
+          f"{' --pin' if args.pin else ''}")
+    if fastest is not best:
+        print(f"Lowest median latency: {fastest['workers']} workers x {fastest['threads']} threads "
+              f"(p50 {fastest['p50']:.1f} ms, {fastest['rps']:.2f} req/s)")
+
+
+if __name__ == '__main__':
+    main()
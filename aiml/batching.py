@@ -0,0 +1,116 @@
+""" Dynamic micro-batching for model inference.
+    Concurrent requests enqueue single items (frames or crops); a worker thread
+    groups whatever arrives within a short window into one batch, runs a single
+    forward pass and resolves each caller's future with its own output.
+"""
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, name, run_batch, max_batch_size=16, max_wait_ms=5.0):
+        """
+        run_batch takes a list of items and must return a list of outputs
+        of the same length and order.
+        """
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._batch_sizes = Counter()
+        self._queue_wait_total = 0.0
+        self._run_time_total = 0.0
+        self._last_batch_ms = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name=f"batcher-{self.name}", daemon=True)
+                    self._worker.start()
+
+    def submit(self, item):
+        """Queue one item and return a concurrent.futures.Future for its output."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    async def infer(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    async def infer_many(self, items):
+        """Queue several items at once; they usually land in the same batch."""
+        futures = [asyncio.wrap_future(self.submit(item)) for item in items]
+        return list(await asyncio.gather(*futures))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed, but still take anything already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            started = time.perf_counter()
+
+            try:
+                outputs = self.run_batch(items)
+                if len(outputs) != len(items):
+                    raise RuntimeError(f"{self.name} batch returned {len(outputs)} outputs for {len(items)} items")
+                for future, output in zip(futures, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                self._errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+            finished = time.perf_counter()
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._queue_wait_total += sum(started - queued_at for _, _, queued_at in batch)
+            self._run_time_total += finished - started
+            self._last_batch_ms = (finished - started) * 1000
+
+    def stats(self):
+        batches = self._batches or 1
+        items = self._items or 1
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": round(self._items / batches, 2),
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "avg_queue_wait_ms": round(self._queue_wait_total / items * 1000, 2),
+            "avg_batch_run_ms": round(self._run_time_total / batches * 1000, 2),
+            "last_batch_ms": round(self._last_batch_ms, 2),
+        }
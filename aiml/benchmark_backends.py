@@ -0,0 +1,172 @@
+""" Parity check and CPU benchmark of the inference backends against eager PyTorch.
+    Run after export_models.py. Backends whose export files (or runtime) are
+    missing are skipped.
+
+    usage: python benchmark_backends.py [--models cnn yolo] [--batch-sizes 1 8 32] [--iters 10] [--check]
+                                        [--spoilage-model resnet50]
+    With --check the script exits non-zero when any backend drifts beyond tolerance.
+    The same CNN comparison runs under pytest (tests/test_backend_parity.py).
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from model_backends import BACKENDS, CNN_BACKENDS, load_cnn, load_yolo
+from model_registry import DEFAULT_SPOILAGE_MODEL, SPOILAGE_MODELS, get_spoilage_model
+
+# Max allowed |score - eager score| for the CNN, and max box coordinate drift (px) for YOLO.
+# INT8 is expected to drift; quantize_cnn.py gates it on decision flips instead.
+CNN_TOLERANCE = 1e-3
+CNN_TOLERANCE_BY_BACKEND = {'int8': 0.05}
+YOLO_BOX_TOLERANCE = 2.0
+
+
+def time_call(fn, iters, warmup=2):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iters):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings) * 1000
+    return float(np.mean(timings)), float(np.percentile(timings, 95))
+
+
+def load_backends(loader, names):
+    loaded = {}
+    for name in names:
+        try:
+            loaded[name] = loader(name)
+        except Exception as e:
+            print(f"  skipping {name}: {e}")
+    return loaded
+
+
+def cnn_inputs(spec, count, seed=0):
+    """Random input batch at the registry entry's input size (e.g. 160 px for mobilenet_v3_small)."""
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(count, 3, spec['input_size'], spec['input_size'], generator=generator)
+
+
+def compare_cnn(model, reference_model, inputs, threshold):
+    """(max |score - eager score|, decisions flipped at threshold) of model against the eager reference."""
+    with torch.no_grad():
+        scores = model(inputs).view(-1)
+        reference = reference_model(inputs).view(-1)
+    max_diff = float((scores - reference).abs().max())
+    flips = int(((scores > threshold) != (reference > threshold)).sum())
+    return max_diff, flips
+
+
+def cnn_tolerance(backend):
+    return CNN_TOLERANCE_BY_BACKEND.get(backend, CNN_TOLERANCE)
+
+
+def benchmark_cnn(batch_sizes, iters, spec=None):
+    spec = spec or get_spoilage_model()
+    print(f"\nSpoilage CNN ({spec['name']}, {spec['input_size']}px)")
+    backends = load_backends(lambda name: load_cnn(name, torch.device('cpu'), spec), CNN_BACKENDS)
+    if 'eager' not in backends:
+        print("  eager model not available, nothing to compare against")
+        return True
+
+    inputs = cnn_inputs(spec, max(batch_sizes))
+
+    ok = True
+    print(f"  {'backend':<12} {'batch':>5} {'mean ms':>9} {'p95 ms':>9} {'img/s':>9} {'max diff':>10} {'flips':>6}")
+    for name, model in backends.items():
+        max_diff, flips = compare_cnn(model, backends['eager'], inputs, spec['threshold'])
+        if max_diff > cnn_tolerance(name):
+            ok = False
+
+        for batch_size in batch_sizes:
+            batch = inputs[:batch_size]
+
+            def run():
+                with torch.no_grad():
+                    model(batch)
+
+            mean_ms, p95_ms = time_call(run, iters)
+            print(f"  {name:<12} {batch_size:>5} {mean_ms:>9.1f} {p95_ms:>9.1f} "
+                  f"{batch_size / mean_ms * 1000:>9.1f} {max_diff:>10.2e} {flips:>6}")
+    return ok
+
+
+def _sample_frames(count):
+    frames = []
+    for path in sorted(glob.glob('dataset/Validation_data/*')):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            frames.append(cv2.resize(image, (640, 480)))
+    rng = np.random.default_rng(0)
+    while len(frames) < count:
+        frames.append(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8))
+    return frames[:count]
+
+
+def _max_box_drift(boxes, reference):
+    """Largest coordinate difference between each box and its closest reference box."""
+    if len(boxes) == 0 or len(reference) == 0:
+        return 0.0 if len(boxes) == len(reference) else float('inf')
+    distances = np.abs(boxes[:, None, :] - reference[None, :, :]).max(axis=2)
+    return float(max(distances.min(axis=1).max(), distances.min(axis=0).max()))
+
+
+def benchmark_yolo(batch_sizes, iters, conf=0.25):
+    print("\nYOLO detector")
+    backends = load_backends(load_yolo, BACKENDS)
+    if 'eager' not in backends:
+        print("  eager model not available, nothing to compare against")
+        return True
+
+    frames = _sample_frames(max(batch_sizes))
+    reference = [r.boxes.xyxy.cpu().numpy() for r in backends['eager'](frames, conf=conf, device='cpu', verbose=False)]
+
+    ok = True
+    print(f"  {'backend':<12} {'batch':>5} {'mean ms':>9} {'p95 ms':>9} {'img/s':>9} {'box drift':>10} {'count diff':>10}")
+    for name, yolo in backends.items():
+        results = yolo(frames, conf=conf, device='cpu', verbose=False)
+        boxes = [r.boxes.xyxy.cpu().numpy() for r in results]
+        drift = max(_max_box_drift(b, ref) for b, ref in zip(boxes, reference))
+        count_diff = sum(abs(len(b) - len(ref)) for b, ref in zip(boxes, reference))
+        if drift > YOLO_BOX_TOLERANCE:
+            ok = False
+
+        for batch_size in batch_sizes:
+            batch = frames[:batch_size]
+            mean_ms, p95_ms = time_call(lambda: yolo(batch, conf=conf, device='cpu', verbose=False), iters)
+            print(f"  {name:<12} {batch_size:>5} {mean_ms:>9.1f} {p95_ms:>9.1f} "
+                  f"{batch_size / mean_ms * 1000:>9.1f} {drift:>10.2f} {count_diff:>10}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends with eager PyTorch")
+    parser.add_argument('--models', nargs='+', choices=['cnn', 'yolo'], default=['cnn', 'yolo'])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--iters', type=int, default=10)
+    parser.add_argument('--check', action='store_true', help="exit non-zero on parity failures")
+    parser.add_argument('--spoilage-model', choices=sorted(SPOILAGE_MODELS),
+                        default=os.getenv("SPOILAGE_MODEL", DEFAULT_SPOILAGE_MODEL))
+    args = parser.parse_args()
+
+    ok = True
+    if 'cnn' in args.models:
+        ok = benchmark_cnn(args.batch_sizes, args.iters, get_spoilage_model(args.spoilage_model)) and ok
+    if 'yolo' in args.models:
+        ok = benchmark_yolo(args.batch_sizes, args.iters) and ok
+
+    print("\nParity: " + ("OK" if ok else "FAILED"))
+    if args.check and not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+""" Decode process pool that hands frames back through shared memory.
+    With DECODE_POOL=shm, frame decoding (base64 + imdecode) runs in worker
+    processes, so large uploads decode on other cores while the inference
+    threads run the models. A worker writes the decoded frame into a slot of
+    a shared FrameRing and returns only its shape; the event loop wraps the
+    slot in a NumPy view, so the pixels are never pickled back. The caller
+    releases the slot once it is done with the frame.
+    When every slot is taken, or a frame is larger than a slot, the frame comes
+    back through the pipe as with DECODE_POOL=process.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from frame_ring import FrameRing
+
+_ring = None  # the pool's ring, attached in each worker process
+
+
+def _attach(spec):
+    global _ring
+    _ring = FrameRing.attach(spec)
+
+
+def _decode_into_slot(slot, fn, data, *args):
+    """
+    Worker side: fn(data, *args) returns a frame or (frame, timings). The frame
+    is copied into slot when it fits; returns (shape or None, result without
+    the frame, or the full result when it did not go through shared memory).
+    """
+    result = fn(data, *args)
+    frame, extra = result if isinstance(result, tuple) else (result, None)
+    if slot is None or frame is None or frame.nbytes > _ring.slot_bytes:
+        return None, result
+    started = time.perf_counter()
+    height, width = frame.shape[:2]
+    _ring.view(slot, height, width)[...] = frame
+    if isinstance(extra, dict):
+        extra["shm_write"] = (time.perf_counter() - started) * 1000
+    return (height, width), (isinstance(result, tuple), extra)
+
+
+def _noop():
+    pass
+
+
+class SharedDecodePool:
+    def __init__(self, workers=2, slots=16, max_height=1080, max_width=1920):
+        """
+        slots: frames that can be held at once (decoded and not yet released).
+        max_height x max_width: pixel budget of a slot; any frame with at most
+            that many pixels fits, in either orientation.
+        """
+        self.ring = FrameRing.create(slots, max_height, max_width)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(self.ring.spec(),))
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+        self.shared = 0
+        self.fallback = 0
+
+    def _take_slot(self):
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def _release_slot(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    async def decode(self, loop, fn, data, *args):
+        """
+        fn(data, *args) in a worker process. Returns (result, release): result is
+        what fn returns, with the frame as a view into shared memory that stays
+        valid until release() is called.
+        """
+        slot = self._take_slot()
+        future = loop.run_in_executor(self.executor, _decode_into_slot, slot, fn, data, *args)
+        try:
+            # Shielded: a cancelled caller must not free the slot while a worker may still write into it
+            shape, result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if slot is not None:
+                future.add_done_callback(lambda _: self._release_slot(slot))
+            raise
+        except BaseException:
+            if slot is not None:
+                self._release_slot(slot)
+            raise
+        if shape is None:
+            if slot is not None:
+                self._release_slot(slot)
+            if (result[0] if isinstance(result, tuple) else result) is not None:
+                self.fallback += 1
+            return result, _noop
+
+        self.shared += 1
+        frame = self.ring.view(slot, *shape)
+        returns_tuple, extra = result
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                self._release_slot(slot)
+        return ((frame, extra) if returns_tuple else frame), release
+
+    def stats(self):
+        with self._lock:
+            free = len(self._free)
+        return {
+            "slots": self.ring.slots,
+            "slots_free": free,
+            "slot_pixels": self.ring.max_height * self.ring.max_width,
+            "shared_frames": self.shared,
+            "fallback_frames": self.fallback,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.ring.close()
@@ -0,0 +1,158 @@
+""" Distil the ResNet50 spoilage classifier into a lighter registry tier.
+    The teacher's sigmoid scores are the soft targets, so unlabeled shelf photos
+    are enough. Images inside freshapples/ or rottenapples/ folders (the labels
+    /detect uses) also contribute their hard label, weighted by --label-weight.
+    The student is saved to its registry weights path and served with
+    SPOILAGE_MODEL=<name>.
+
+    usage: python distill_spoilage.py --student mobilenet_v3_small [--data dataset] [--epochs 10]
+                                      [--pretrained] [--label-weight 0.5]
+"""
+import argparse
+import glob
+import os
+import random
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+
+from model_backends import build_spoilage_cnn
+from model_registry import DEFAULT_SPOILAGE_MODEL, SPOILAGE_MODELS, create_spoilage_model, get_spoilage_model
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+LABELS = {'freshapples': 0.0, 'rottenapples': 1.0}
+
+
+def find_images(root):
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(root, '**', pattern), recursive=True))
+    # -1 marks "no hard label"; only the teacher supervises those images
+    return [(p, LABELS.get(os.path.basename(os.path.dirname(p)), -1.0)) for p in paths]
+
+
+class DistillationDataset(Dataset):
+    """Yields the same augmented view at the teacher's and the student's input size."""
+
+    def __init__(self, samples, teacher_spec, student_spec, train=True, repeats=1):
+        self.samples = samples * repeats
+        size = teacher_spec['input_size']
+        if train:
+            self.augment = transforms.Compose([
+                transforms.RandomResizedCrop(size, scale=(0.4, 1.0)),
+                transforms.RandomHorizontalFlip(),
+                transforms.ColorJitter(0.2, 0.2, 0.2, 0.02),
+            ])
+        else:
+            self.augment = transforms.Resize((size, size))
+        self.to_tensor = transforms.ToTensor()
+        self.teacher_norm = transforms.Normalize(teacher_spec['mean'], teacher_spec['std'])
+        self.student_norm = transforms.Normalize(student_spec['mean'], student_spec['std'])
+        self.student_size = student_spec['input_size']
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        path, label = self.samples[index]
+        view = self.to_tensor(self.augment(Image.open(path).convert('RGB')))
+        teacher_input = self.teacher_norm(view)
+        student_view = F.interpolate(view[None], size=(self.student_size, self.student_size),
+                                     mode='bilinear', antialias=True, align_corners=False)[0]
+        return teacher_input, self.student_norm(student_view), torch.tensor(label)
+
+
+def distillation_loss(student_scores, teacher_scores, labels, label_weight):
+    loss = F.binary_cross_entropy(student_scores, teacher_scores)
+    labeled = labels >= 0
+    if label_weight > 0 and labeled.any():
+        loss = loss + label_weight * F.binary_cross_entropy(student_scores[labeled], labels[labeled])
+    return loss
+
+
+def evaluate(student, teacher, loader, threshold):
+    student.eval()
+    agree = total = 0
+    abs_diff = 0.0
+    with torch.no_grad():
+        for teacher_input, student_input, _ in loader:
+            t = teacher(teacher_input).view(-1)
+            s = student(student_input).view(-1)
+            agree += int(((t > threshold) == (s > threshold)).sum())
+            abs_diff += float((t - s).abs().sum())
+            total += len(t)
+    return agree / max(total, 1), abs_diff / max(total, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil the ResNet50 spoilage model into a lighter tier")
+    parser.add_argument('--student', choices=sorted(set(SPOILAGE_MODELS) - {DEFAULT_SPOILAGE_MODEL}), required=True)
+    parser.add_argument('--teacher', choices=sorted(SPOILAGE_MODELS), default=DEFAULT_SPOILAGE_MODEL)
+    parser.add_argument('--data', default='dataset')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--label-weight', type=float, default=0.5)
+    parser.add_argument('--repeats', type=int, default=20, help="augmented views per image per epoch")
+    parser.add_argument('--val-fraction', type=float, default=0.1)
+    parser.add_argument('--pretrained', action='store_true', help="start the student from ImageNet weights")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--output', help="defaults to the student's registry weights path")
+    args = parser.parse_args()
+
+    teacher_spec = get_spoilage_model(args.teacher)
+    student_spec = get_spoilage_model(args.student)
+    output = args.output or student_spec['weights']
+
+    samples = find_images(args.data)
+    if not samples:
+        raise SystemExit(f"No images found under {args.data}/")
+    random.Random(0).shuffle(samples)
+    n_val = max(1, int(len(samples) * args.val_fraction)) if len(samples) > 1 else 0
+    val_samples, train_samples = samples[:n_val], samples[n_val:] or samples
+
+    train_loader = DataLoader(
+        DistillationDataset(train_samples, teacher_spec, student_spec, train=True, repeats=args.repeats),
+        batch_size=args.batch_size, shuffle=True, num_workers=args.workers
+    )
+    val_loader = DataLoader(
+        DistillationDataset(val_samples or train_samples, teacher_spec, student_spec, train=False),
+        batch_size=args.batch_size, num_workers=args.workers
+    )
+
+    teacher = build_spoilage_cnn(teacher_spec)
+    student = create_spoilage_model(student_spec['arch'], pretrained_backbone=args.pretrained)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs * len(train_loader))
+
+    print(f"Distilling {teacher_spec['name']} -> {student_spec['name']} on {len(train_samples)} images "
+          f"({len(val_samples)} held out)")
+    best_agreement = -1.0
+    for epoch in range(1, args.epochs + 1):
+        student.train()
+        running = 0.0
+        for teacher_input, student_input, labels in train_loader:
+            with torch.no_grad():
+                teacher_scores = teacher(teacher_input).view(-1)
+            student_scores = student(student_input).view(-1)
+            loss = distillation_loss(student_scores, teacher_scores, labels, args.label_weight)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            running += loss.item() * len(labels)
+
+        agreement, mean_diff = evaluate(student, teacher, val_loader, teacher_spec['threshold'])
+        print(f"epoch {epoch}: loss={running / len(train_loader.dataset):.4f} "
+              f"teacher_agreement={agreement:.2%} mean_abs_score_diff={mean_diff:.4f}")
+        if agreement > best_agreement:
+            best_agreement = agreement
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            torch.save(student.state_dict(), output)
+
+    print(f"Saved {student_spec['name']} weights to {output} (best teacher agreement {best_agreement:.2%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+""" Export the YOLO detector and the spoilage CNN for the non-eager backends.
+    Writes TorchScript / ONNX (and optionally OpenVINO) files to models/exported/,
+    which app.py loads when YOLO_BACKEND / CNN_BACKEND select them.
+
+    usage: python export_models.py [--models cnn yolo fused] [--formats torchscript onnx openvino]
+                                   [--spoilage-model resnet50]
+"""
+import argparse
+import os
+import shutil
+
+import torch
+
+from model_backends import (EXPORT_DIR, FUSED_YOLO_WEIGHTS, YOLO_WEIGHTS, build_spoilage_cnn, cnn_export_path,
+                            yolo_export_path)
+from model_registry import DEFAULT_SPOILAGE_MODEL, SPOILAGE_MODELS, get_spoilage_model
+
+EXPORT_FORMATS = ('torchscript', 'onnx', 'openvino')
+
+
+def export_cnn(formats, spec=None):
+    spec = spec or get_spoilage_model()
+    name = spec['export_name']
+    model = build_spoilage_cnn(spec)
+    example = torch.randn(2, 3, spec['input_size'], spec['input_size'])
+    written = []
+
+    if 'torchscript' in formats:
+        path = cnn_export_path('torchscript', name)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        traced.save(path)
+        written.append(path)
+
+    if 'onnx' in formats or 'openvino' in formats:
+        path = cnn_export_path('onnx', name)
+        torch.onnx.export(
+            model, example, path,
+            input_names=['images'],
+            output_names=['scores'],
+            dynamic_axes={'images': {0: 'batch'}, 'scores': {0: 'batch'}},
+            opset_version=17,
+            dynamo=False
+        )
+        written.append(path)
+
+    return written
+
+
+def export_yolo(formats, weights=YOLO_WEIGHTS, name='yolo_apple', imgsz=640):
+    from ultralytics import YOLO
+
+    written = []
+    for fmt in formats:
+        yolo = YOLO(weights)
+        # Dynamic axes so batched calls (several frames / tiles) work with ONNX and OpenVINO
+        options = {'dynamic': True} if fmt in ('onnx', 'openvino') else {}
+        exported = yolo.export(format=fmt, imgsz=imgsz, device='cpu', **options)
+
+        target = yolo_export_path(fmt, name)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        shutil.move(str(exported), target)
+        written.append(target)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models for the TorchScript / ONNX / OpenVINO backends")
+    parser.add_argument('--models', nargs='+', choices=['cnn', 'yolo', 'fused'], default=['cnn', 'yolo'])
+    parser.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=['torchscript', 'onnx'])
+    parser.add_argument('--spoilage-model', choices=sorted(SPOILAGE_MODELS), default=DEFAULT_SPOILAGE_MODEL)
+    args = parser.parse_args()
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    if 'cnn' in args.models:
+        for path in export_cnn(args.formats, get_spoilage_model(args.spoilage_model)):
+            print(f"Exported CNN: {path}")
+    if 'yolo' in args.models:
+        for path in export_yolo(args.formats):
+            print(f"Exported YOLO: {path}")
+    if 'fused' in args.models:
+        for path in export_yolo(args.formats, FUSED_YOLO_WEIGHTS, 'yolo_apple_fused'):
+            print(f"Exported fused detector: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Shared-memory frame ring.
+    One multiprocessing.shared_memory block holds a fixed number of frame slots
+    of max_height x max_width x 3 uint8. A producer writes a frame into a free
+    slot and passes only the slot index and shape to a consumer process, which
+    reads the pixels through a NumPy view of the same memory, so frames never
+    go through a pipe or get pickled. Which slots are free is tracked by the
+    caller (a queue of slot indices).
+"""
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    def __init__(self, shm, slots, max_height, max_width, owner=False):
+        self.shm = shm
+        self.slots = slots
+        self.max_height = max_height
+        self.max_width = max_width
+        self.owner = owner
+        self.slot_bytes = max_height * max_width * 3
+
+    @classmethod
+    def create(cls, slots, max_height, max_width):
+        shm = shared_memory.SharedMemory(create=True, size=slots * max_height * max_width * 3)
+        return cls(shm, slots, max_height, max_width, owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        """Open a ring created in another process from its spec()."""
+        name, slots, max_height, max_width = spec
+        return cls(shared_memory.SharedMemory(name=name), slots, max_height, max_width)
+
+    def spec(self):
+        """Picklable description for attach() in a child process."""
+        return (self.shm.name, self.slots, self.max_height, self.max_width)
+
+    def fit(self, frame):
+        """frame scaled down (never up) to fit a slot, and the scale that was applied."""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_height / height, self.max_width / width)
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame, scale
+
+    def write(self, slot, frame):
+        """Copy a BGR frame into slot (scaled to fit); returns (height, width, scale)."""
+        frame, scale = self.fit(frame)
+        height, width = frame.shape[:2]
+        self.view(slot, height, width)[...] = frame
+        return height, width, scale
+
+    def view(self, slot, height, width):
+        """
+        Zero-copy (height, width, 3) view of a slot, contiguous like a decoded
+        image; valid until the slot is reused.
+        """
+        return np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def close(self):
+        # Any views still referenced keep the mapping open until they are dropped
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,470 @@
+""" Multi-camera ingestion agent for an edge box (supersedes archive/detect_predict.py).
+    One reader process per source (camera index, stream URL, video file or
+    image directory as a stand-in camera) writes frames into a shared-memory
+    ring (frame_ring.py) and queues only the slot index. Inference processes
+    take batches of slots, run YOLO and the spoilage CNN on zero-copy views of
+    the ring, hand the slots back and queue compact results. The main process
+    posts results in batches to the API's /agent_results over one pooled
+    keep-alive connection (or writes them as NDJSON with --out).
+
+    Live sources drop frames when every slot is busy (the newest frames are what
+    matter); files and directories wait for a slot instead, so nothing is skipped.
+
+    usage: python ingest_agent.py --source aisle3-left=0 --source aisle3-right=rtsp://... \\
+                                  [--source demo=videos/shelf.mp4] [--source dir=dataset/Validation_data]
+                                  [--workers 2] [--batch 8] [--server http://localhost:8000] [--out results.ndjson]
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+
+import cv2
+
+from frame_ring import FrameRing
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp', '*.bmp')
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+
+def parse_source(spec, index):
+    """'name=target' or 'target' -> (name, kind, target); kind is camera, stream, video or images."""
+    name, target = f"source{index}", spec
+    if '=' in spec and not spec.lower().startswith(STREAM_SCHEMES):
+        name, target = spec.split('=', 1)
+    if target.isdigit():
+        return name, 'camera', int(target)
+    if target.lower().startswith(STREAM_SCHEMES):
+        return name, 'stream', target
+    if os.path.isdir(target):
+        return name, 'images', target
+    if os.path.isfile(target):
+        return name, 'video', target
+    raise ValueError(f"Source {spec!r} is not a camera index, stream URL, video file or directory")
+
+
+def iter_source(kind, target, fps, loop, stop):
+    """Yield BGR frames from a source; files and directories are paced at fps (0 = as fast as possible)."""
+    if kind == 'images':
+        paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(target, '**', pattern), recursive=True))
+        if not paths:
+            return
+        while not stop.is_set():
+            for path in paths:
+                frame = cv2.imread(path, cv2.IMREAD_COLOR)
+                if frame is not None:
+                    yield frame
+                if fps:
+                    time.sleep(1.0 / fps)
+                if stop.is_set():
+                    return
+            if not loop:
+                return
+        return
+
+    while not stop.is_set():
+        capture = cv2.VideoCapture(target)
+        if not capture.isOpened():
+            print(f"Could not open {kind} source {target}")
+            return
+        # Recorded video plays back at its own rate unless --fps overrides it; live sources pace themselves
+        interval = 1.0 / (fps or capture.get(cv2.CAP_PROP_FPS) or 25) if kind == 'video' else 0.0
+        next_at = time.perf_counter()
+        try:
+            while not stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield frame
+                if interval:
+                    next_at += interval
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+        finally:
+            capture.release()
+        if kind != 'video' or not loop:
+            return
+
+
+def run_reader(name, kind, target, ring_spec, free_slots, work, stop, counters, fps, loop):
+    """Reader process: frames -> free ring slots -> work queue of slot descriptors."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the main process coordinates shutdown
+    ring = FrameRing.attach(ring_spec)
+    live = kind in ('camera', 'stream')
+    frame_index = -1
+    try:
+        for frame in iter_source(kind, target, fps, loop, stop):
+            frame_index += 1
+            slot = None
+            while slot is None and not stop.is_set():
+                try:
+                    slot = free_slots.get(block=not live, timeout=None if live else 0.5)
+                except queue.Empty:
+                    if live:
+                        break
+            if slot is None:
+                with counters['dropped'].get_lock():
+                    counters['dropped'].value += 1
+                continue
+            height, width, scale = ring.write(slot, frame)
+            work.put((slot, name, frame_index, time.time(), height, width, scale))
+            with counters['read'].get_lock():
+                counters['read'].value += 1
+    finally:
+        ring.close()
+
+
+def load_agent_models(options):
+    """YOLO plus the spoilage scorer for one inference process."""
+    import torch
+    from model_backends import FUSED_YOLO_WEIGHTS, fused_spoilage_scores, load_cnn, load_yolo
+    from model_registry import get_spoilage_model
+    from preprocess import CropPreprocessor
+
+    if options['threads']:
+        torch.set_num_threads(options['threads'])
+    if options['fused']:
+        yolo = load_yolo(options['yolo_backend'], FUSED_YOLO_WEIGHTS, 'yolo_apple_fused')
+        return yolo, (lambda crops, conf, cls: fused_spoilage_scores(conf, cls).tolist()), 0.5
+
+    spec = get_spoilage_model(options['spoilage_model'])
+    cnn = load_cnn(options['cnn_backend'], torch.device('cpu'), spec)
+    preprocess = CropPreprocessor(spec['input_size'], spec['mean'], spec['std'], max_batch_size=options['batch'] * 8)
+
+    def score(crops, conf, cls):
+        if not crops:
+            return []
+        with torch.no_grad():
+            return cnn(preprocess(crops)).view(-1).tolist()
+    return load_yolo(options['yolo_backend']), score, spec['threshold']
+
+
+def take_batch(work, size, wait_s):
+    """Up to size descriptors: block for the first, then take what arrives within wait_s. None marks shutdown."""
+    first = work.get()
+    if first is None:
+        return [], True
+    batch = [first]
+    deadline = time.perf_counter() + wait_s
+    while len(batch) < size:
+        try:
+            item = work.get(timeout=max(0.0, deadline - time.perf_counter()))
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+def run_inference_worker(index, ring_spec, free_slots, work, results, counters, holders, options):
+    """
+    Inference process: batches of ring slots -> YOLO + spoilage scores -> results queue.
+    holders[slot] is index + 1 while this process holds the slot, so the main
+    process can take the slots back if this one dies mid-batch.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = FrameRing.attach(ring_spec)
+    try:
+        yolo, score, threshold = load_agent_models(options)
+    except Exception as e:
+        # Report it instead of dying silently; the main process is waiting for 'ready'
+        results.put(('error', f"infer-{index} could not load its models: {e}"))
+        ring.close()
+        return
+    results.put(('ready', index))
+
+    done = False
+    while not done:
+        batch, done = take_batch(work, options['batch'], options['batch_wait_ms'] / 1000)
+        if not batch:
+            break
+        for slot, *_ in batch:
+            holders[slot] = index + 1
+        started = time.perf_counter()
+        try:
+            frames = [ring.view(slot, height, width) for slot, _, _, _, height, width, _ in batch]
+            detections = yolo(frames, conf=options['conf'], device='cpu', verbose=False)
+            per_frame = []
+            crops, confs, classes = [], [], []
+            for frame, result in zip(frames, detections):
+                kept = []
+                boxes = result.boxes.xyxy.cpu().numpy()
+                for box, conf, cls in zip(boxes, result.boxes.conf.cpu().numpy(), result.boxes.cls.cpu().numpy()):
+                    x1, y1, x2, y2 = (int(v) for v in box[:4])
+                    x1, y1 = max(0, x1), max(0, y1)
+                    crop = frame[y1:y2, x1:x2]  # still a view into the ring
+                    if crop.size == 0:
+                        continue
+                    kept.append(((x1, y1, x2, y2), float(conf)))
+                    crops.append(crop)
+                    confs.append(conf)
+                    classes.append(cls)
+                per_frame.append(kept)
+            scores = iter(score(crops, confs, classes))
+            error = None
+        except Exception as e:
+            per_frame, scores, error = [[] for _ in batch], iter(()), str(e)
+        finally:
+            # Crops are preprocessed by now; the slots can take new frames
+            frames = crops = None
+            for slot, *_ in batch:
+                # Cleared first: a slot must never be both in free_slots and reclaimable
+                holders[slot] = 0
+                free_slots.put(slot)
+
+        infer_ms = (time.perf_counter() - started) * 1000
+        records = []
+        for (_, name, frame_index, timestamp, height, width, scale), kept in zip(batch, per_frame):
+            record = {"camera_id": name, "frame_index": frame_index, "timestamp": timestamp,
+                      "width": round(width / scale), "height": round(height / scale), "detections": []}
+            for (x1, y1, x2, y2), conf in kept:
+                pred = next(scores)
+                record["detections"].append({
+                    # Boxes are reported in the source's own resolution
+                    "box": [round(x1 / scale), round(y1 / scale), round(x2 / scale), round(y2 / scale)],
+                    "confidence": round(conf, 4),
+                    "score": round(pred, 4),
+                    "prediction": 'rottenapples' if pred > threshold else 'freshapples',
+                })
+            if error is not None:
+                record["error"] = error
+            records.append(record)
+        results.put(('results', records))
+
+        with counters['frames'].get_lock():
+            counters['frames'].value += len(batch)
+        with counters['batches'].get_lock():
+            counters['batches'].value += 1
+        with counters['infer_ms'].get_lock():
+            counters['infer_ms'].value += infer_ms
+    ring.close()
+
+
+def reclaim_slots(holders, index, free_slots):
+    """Hand back the ring slots a dead inference process still held; returns how many."""
+    slots = [slot for slot, holder in enumerate(holders) if holder == index + 1]
+    for slot in slots:
+        holders[slot] = 0
+        free_slots.put(slot)
+    return len(slots)
+
+
+class ResultPoster:
+    """Batches results and posts them over one pooled keep-alive session (or appends NDJSON to a file)."""
+
+    def __init__(self, server, out, batch_size, interval_s, agent_id, timeout_s=10):
+        self.url = server.rstrip('/') + '/agent_results' if server else None
+        self.out = open(out, 'a') if out else None
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.agent_id = agent_id
+        self.timeout_s = timeout_s
+        self.pending = []
+        self._last_flush = time.monotonic()
+        self.posted = 0
+        self.failed = 0
+        self.requests = 0
+        self.session = None
+        if self.url:
+            import requests
+            from requests.adapters import HTTPAdapter
+            self.session = requests.Session()
+            self.session.mount(self.url.split('/agent_results')[0], HTTPAdapter(pool_connections=1, pool_maxsize=1,
+                                                                               max_retries=2))
+
+    def add(self, records):
+        self.pending.extend(records)
+        if len(self.pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval_s:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        if self.out is not None:
+            self.out.writelines(json.dumps(record) + "\n" for record in batch)
+            self.out.flush()
+        if self.session is not None:
+            try:
+                response = self.session.post(self.url, json={"agent_id": self.agent_id, "results": batch},
+                                             timeout=self.timeout_s)
+                response.raise_for_status()
+                self.posted += len(batch)
+            except Exception as e:
+                # Results are not re-queued: the next frames supersede them
+                self.failed += len(batch)
+                print(f"Posting {len(batch)} results failed: {e}")
+            self.requests += 1
+
+    def close(self):
+        self.flush()
+        if self.out is not None:
+            self.out.close()
+        if self.session is not None:
+            self.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read several cameras/videos/image folders and post spoilage results")
+    parser.add_argument('--source', action='append', required=True,
+                        help="[name=]camera index | stream URL | video file | image directory (repeatable)")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="inference processes")
+    parser.add_argument('--threads', type=int, default=0, help="torch threads per inference process (0 = torch default)")
+    parser.add_argument('--batch', type=int, default=8, help="frames per YOLO call")
+    parser.add_argument('--batch-wait-ms', type=float, default=10.0)
+    parser.add_argument('--slots', type=int, default=0, help="ring slots (default: 4 per source + 2 batches per worker)")
+    parser.add_argument('--max-size', default='1280x720', help="largest frame kept in the ring, WxH (bigger frames are scaled down)")
+    parser.add_argument('--fps', type=float, default=0.0, help="playback rate for files/directories (0 = video rate, 5 fps for images)")
+    parser.add_argument('--loop', action='store_true', help="replay video files and image directories")
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--yolo-backend', default=os.getenv("YOLO_BACKEND", "eager"))
+    parser.add_argument('--cnn-backend', default=os.getenv("CNN_BACKEND", "eager"))
+    parser.add_argument('--spoilage-model', default=os.getenv("SPOILAGE_MODEL", "resnet50"))
+    parser.add_argument('--fused', action='store_true', default=os.getenv("FUSED_DETECTOR", "0") == "1")
+    parser.add_argument('--server', default=os.getenv("RESQCART_API", "http://localhost:8000"),
+                        help="API that receives results at /agent_results ('' to disable)")
+    parser.add_argument('--out', default=None, help="also append results as NDJSON to this file")
+    parser.add_argument('--post-batch', type=int, default=64, help="results per POST")
+    parser.add_argument('--post-interval', type=float, default=1.0, help="seconds before a partial batch is posted")
+    parser.add_argument('--agent-id', default=os.uname().nodename)
+    parser.add_argument('--stats-interval', type=float, default=10.0)
+    args = parser.parse_args()
+
+    sources = [parse_source(spec, i) for i, spec in enumerate(args.source)]
+    max_width, max_height = (int(v) for v in args.max_size.lower().split('x'))
+    slots = args.slots or 4 * len(sources) + 2 * args.workers * args.batch
+    ctx = mp.get_context('spawn')
+
+    ring = FrameRing.create(slots, max_height, max_width)
+    free_slots, work, results = ctx.Queue(), ctx.Queue(), ctx.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+    holders = ctx.Array('i', slots, lock=False)  # slot -> inference process index + 1, 0 when not held
+    stop = ctx.Event()
+    reader_counters = {name: {'read': ctx.Value('q', 0), 'dropped': ctx.Value('q', 0)} for name, _, _ in sources}
+    worker_counters = {'frames': ctx.Value('q', 0), 'batches': ctx.Value('q', 0), 'infer_ms': ctx.Value('d', 0.0)}
+    options = {
+        'threads': args.threads, 'batch': args.batch, 'batch_wait_ms': args.batch_wait_ms, 'conf': args.conf,
+        'yolo_backend': args.yolo_backend, 'cnn_backend': args.cnn_backend,
+        'spoilage_model': args.spoilage_model, 'fused': args.fused,
+    }
+    print(f"Ring: {slots} slots of {max_width}x{max_height} ({slots * ring.slot_bytes / 2**20:.0f} MB shared), "
+          f"{len(sources)} sources, {args.workers} inference processes")
+
+    workers = [ctx.Process(target=run_inference_worker, name=f"infer-{i}",
+                           args=(i, ring.spec(), free_slots, work, results, worker_counters, holders, options))
+               for i in range(args.workers)]
+    for process in workers:
+        process.start()
+    # Readers start once the models are loaded, so live sources do not drop their first seconds
+    ready = 0
+    failure = None
+    while ready < len(workers) and failure is None:
+        try:
+            kind, detail = results.get(timeout=1.0)
+        except queue.Empty:
+            dead = [p for p in workers if not p.is_alive()]
+            if dead:
+                failure = f"{dead[0].name} exited with code {dead[0].exitcode} before loading its models"
+            continue
+        if kind == 'error':
+            failure = detail
+        ready += kind == 'ready'
+    if failure is not None:
+        for process in workers:
+            process.terminate()
+            process.join(timeout=5)
+        ring.close()
+        raise SystemExit(f"Agent not started: {failure}")
+
+    readers = [ctx.Process(target=run_reader, name=f"reader-{name}",
+                           args=(name, kind, target, ring.spec(), free_slots, work, stop,
+                                 reader_counters[name], args.fps or (5.0 if kind == 'images' else 0.0), args.loop))
+               for name, kind, target in sources]
+    for process in readers:
+        process.start()
+    print(f"Agent running with sources {[(name, kind) for name, kind, _ in sources]}")
+
+    interrupted = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: interrupted.set())
+    signal.signal(signal.SIGTERM, lambda *_: interrupted.set())
+
+    poster = ResultPoster(args.server, args.out, args.post_batch, args.post_interval, args.agent_id)
+    started = last_stats = time.monotonic()
+    stopping = False
+    failed_worker = None
+    reclaimed = set()
+    finished_workers = 0
+    try:
+        while finished_workers < len(workers):
+            for i, process in enumerate(workers):
+                if i in reclaimed or process.is_alive():
+                    continue
+                # A crashed or killed worker never ran its finally; its batch's slots would stay taken
+                reclaimed.add(i)
+                count = reclaim_slots(holders, i, free_slots)
+                if process.exitcode != 0 and failed_worker is None:
+                    failed_worker = process.name
+                    print(f"{process.name} exited with code {process.exitcode}; reclaimed {count} ring slots, stopping")
+            if not stopping and (interrupted.is_set() or failed_worker is not None
+                                 or not any(p.is_alive() for p in readers)):
+                # Stop readers, then let the workers drain what is queued and exit
+                stopping = True
+                stop.set()
+                for process in readers:
+                    process.join()
+                for _ in workers:
+                    work.put(None)
+            try:
+                kind, records = results.get(timeout=0.5)
+                if kind == 'results':
+                    poster.add(records)
+            except queue.Empty:
+                poster.add([])
+            finished_workers = sum(not p.is_alive() for p in workers)
+
+            if time.monotonic() - last_stats >= args.stats_interval:
+                last_stats = time.monotonic()
+                frames = worker_counters['frames'].value
+                batches = worker_counters['batches'].value or 1
+                print(json.dumps({
+                    "event": "agent_stats",
+                    "uptime_s": round(last_stats - started, 1),
+                    "sources": {name: {k: v.value for k, v in c.items()} for name, c in reader_counters.items()},
+                    "frames_inferred": frames,
+                    "avg_batch": round(frames / batches, 2),
+                    "avg_batch_ms": round(worker_counters['infer_ms'].value / batches, 1),
+                    "posted": poster.posted,
+                    "post_failed": poster.failed,
+                    "post_requests": poster.requests,
+                }))
+        # Results queued after the last poll
+        while True:
+            try:
+                kind, records = results.get(timeout=0.5)
+            except queue.Empty:
+                break
+            if kind == 'results':
+                poster.add(records)
+    finally:
+        stop.set()
+        for process in readers + workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        poster.close()
+        ring.close()
+        print(f"Agent stopped: {worker_counters['frames'].value} frames inferred, {poster.posted} results posted, "
+              f"{sum(c['dropped'].value for c in reader_counters.values())} frames dropped")
+    if failed_worker is not None:
+        raise SystemExit(f"Agent stopped because {failed_worker} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+""" Inference backends for the YOLO detector and the spoilage CNN.
+    Both models can run as eager PyTorch (the trained weights), TorchScript,
+    ONNX Runtime or OpenVINO. Non-eager backends load the files written by
+    export_models.py into models/exported/. The CNN additionally has an INT8
+    backend produced by quantize_cnn.py.
+"""
+import os
+
+import numpy as np
+import torch
+
+from model_registry import create_spoilage_model, get_spoilage_model
+
+YOLO_WEIGHTS = 'models/trained/yolo_apple.pt'
+# Detector with fresh/rotten as its classes (train_fused_detector.py), served with FUSED_DETECTOR=1
+FUSED_YOLO_WEIGHTS = 'models/trained/yolo_apple_fused.pt'
+FUSED_CLASSES = ('fresh_apple', 'rotten_apple')
+FUSED_ROTTEN_CLASS = 1
+EXPORT_DIR = 'models/exported'
+
+BACKENDS = ('eager', 'torchscript', 'onnx', 'openvino')
+CNN_BACKENDS = BACKENDS + ('int8',)
+
+# Kernel library for quantized ops ('x86' on recent torch, 'fbgemm' on older builds)
+QUANT_ENGINE = os.getenv(
+    "QUANT_ENGINE",
+    'x86' if 'x86' in torch.backends.quantized.supported_engines else 'fbgemm'
+)
+
+
+def build_spoilage_cnn(spec=None, weights=None, device=torch.device('cpu')):
+    """
+    Registry architecture (ResNet50 by default) with its trained spoilage
+    weights, in eval mode.
+    """
+    spec = spec or get_spoilage_model()
+    model = create_spoilage_model(spec['arch'])
+    model.load_state_dict(torch.load(weights or spec['weights'], map_location=device))
+    model.eval()
+    return model.to(device)
+
+
+def cnn_export_path(backend, name='spoilage_cnn'):
+    if backend == 'torchscript':
+        return os.path.join(EXPORT_DIR, f'{name}.torchscript.pt')
+    if backend == 'int8':
+        return os.path.join(EXPORT_DIR, f'{name}.int8.torchscript.pt')
+    if backend in ('onnx', 'openvino'):
+        # OpenVINO compiles the ONNX export directly
+        return os.path.join(EXPORT_DIR, f'{name}.onnx')
+    raise ValueError(f"No export file for backend '{backend}'")
+
+
+def yolo_export_path(backend, name='yolo_apple'):
+    if backend == 'torchscript':
+        return os.path.join(EXPORT_DIR, f'{name}.torchscript')
+    if backend == 'onnx':
+        return os.path.join(EXPORT_DIR, f'{name}.onnx')
+    if backend == 'openvino':
+        return os.path.join(EXPORT_DIR, f'{name}_openvino_model')
+    raise ValueError(f"No export file for backend '{backend}'")
+
+
+class OnnxRuntimeModel:
+    """Callable wrapper so an ONNX Runtime session can stand in for the torch model."""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(output)
+
+
+class OpenVinoModel:
+    """Callable wrapper around an OpenVINO compiled model (CPU plugin)."""
+
+    def __init__(self, path):
+        import openvino as ov
+
+        self.compiled = ov.Core().compile_model(path, 'CPU')
+
+    def __call__(self, batch):
+        output = self.compiled(batch.detach().cpu().numpy())[0]
+        return torch.from_numpy(output)
+
+
+def load_cnn(backend='eager', device=torch.device('cpu'), spec=None):
+    """
+    Load a spoilage CNN from the registry (ResNet50 by default) for the given backend.
+    Every backend returns a callable mapping a (N, 3, H, W) float tensor
+    to a (N, 1) tensor of spoilage scores.
+    """
+    spec = spec or get_spoilage_model()
+    if backend == 'eager':
+        return build_spoilage_cnn(spec, device=device)
+    path = cnn_export_path(backend, spec['export_name']) if backend in CNN_BACKENDS else None
+    if backend == 'torchscript':
+        model = torch.jit.load(path, map_location=device)
+        model.eval()
+        return model
+    if backend == 'onnx':
+        return OnnxRuntimeModel(path)
+    if backend == 'openvino':
+        return OpenVinoModel(path)
+    if backend == 'int8':
+        # Quantized kernels must match the engine the model was converted with
+        torch.backends.quantized.engine = QUANT_ENGINE
+        model = torch.jit.load(path, map_location='cpu')
+        model.eval()
+        return model
+    raise ValueError(f"Unknown CNN backend '{backend}', expected one of {CNN_BACKENDS}")
+
+
+def load_yolo(backend='eager', weights=YOLO_WEIGHTS, name='yolo_apple'):
+    """Load the YOLO detector; ultralytics picks the runtime from the export format."""
+    from ultralytics import YOLO
+
+    if backend == 'eager':
+        return YOLO(weights)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown YOLO backend '{backend}', expected one of {BACKENDS}")
+    return YOLO(yolo_export_path(backend, name), task='detect')
+
+
+def fused_spoilage_scores(confidences, class_ids):
+    """
+    Rotten scores in [0, 1] for fused-detector boxes, on the same side of 0.5
+    as the predicted class: 0.5 + conf/2 for rotten boxes, 0.5 - conf/2 for fresh.
+    """
+    confidences = np.asarray(confidences, dtype=np.float32)
+    rotten = np.asarray(class_ids) == FUSED_ROTTEN_CLASS
+    return np.where(rotten, 0.5 + confidences / 2, 0.5 - confidences / 2)
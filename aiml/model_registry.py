@@ -0,0 +1,91 @@
+""" Registry of spoilage classifier architectures.
+    Every entry shares the same sigmoid head (Linear -> 128 -> ReLU -> Linear -> 1)
+    and carries the metadata the service needs to run it: weights file, input
+    size, decision threshold and normalization. The service picks one with
+    SPOILAGE_MODEL; lighter tiers are trained with distill_spoilage.py.
+"""
+import torch
+
+from preprocess import IMAGENET_MEAN, IMAGENET_STD
+
+DEFAULT_SPOILAGE_MODEL = 'resnet50'
+
+SPOILAGE_MODELS = {
+    'resnet50': {
+        'arch': 'resnet50',
+        'weights': 'models/trained/spoilage_cnn.pth',
+        'export_name': 'spoilage_cnn',
+        'input_size': 224,
+        'threshold': 0.8,
+        'mean': IMAGENET_MEAN,
+        'std': IMAGENET_STD,
+    },
+    'resnet18': {
+        'arch': 'resnet18',
+        'weights': 'models/trained/spoilage_resnet18.pth',
+        'export_name': 'spoilage_resnet18',
+        'input_size': 224,
+        'threshold': 0.8,
+        'mean': IMAGENET_MEAN,
+        'std': IMAGENET_STD,
+    },
+    'mobilenet_v3_large': {
+        'arch': 'mobilenet_v3_large',
+        'weights': 'models/trained/spoilage_mobilenet_v3_large.pth',
+        'export_name': 'spoilage_mobilenet_v3_large',
+        'input_size': 224,
+        'threshold': 0.8,
+        'mean': IMAGENET_MEAN,
+        'std': IMAGENET_STD,
+    },
+    'mobilenet_v3_small': {
+        'arch': 'mobilenet_v3_small',
+        'weights': 'models/trained/spoilage_mobilenet_v3_small.pth',
+        'export_name': 'spoilage_mobilenet_v3_small',
+        'input_size': 160,
+        'threshold': 0.8,
+        'mean': IMAGENET_MEAN,
+        'std': IMAGENET_STD,
+    },
+}
+
+
+def register_spoilage_model(name, **spec):
+    """Add or override a registry entry, e.g. a retrained tier with its own threshold."""
+    base = dict(SPOILAGE_MODELS.get(name, SPOILAGE_MODELS[DEFAULT_SPOILAGE_MODEL]))
+    base.update(spec)
+    SPOILAGE_MODELS[name] = base
+    return base
+
+
+def get_spoilage_model(name=DEFAULT_SPOILAGE_MODEL):
+    if name not in SPOILAGE_MODELS:
+        raise ValueError(f"Unknown spoilage model '{name}', expected one of {sorted(SPOILAGE_MODELS)}")
+    return dict(SPOILAGE_MODELS[name], name=name)
+
+
+def spoilage_head(in_features):
+    return torch.nn.Sequential(
+        torch.nn.Linear(in_features, 128),
+        torch.nn.ReLU(),
+        torch.nn.Linear(128, 1),
+        torch.nn.Sigmoid()
+    )
+
+
+def create_spoilage_model(arch, pretrained_backbone=False):
+    """Build an architecture with the spoilage head (untrained head, optional ImageNet backbone)."""
+    # Imported here so the service does not pay for torchvision until models are loaded
+    from torchvision import models
+
+    if arch in ('resnet50', 'resnet18'):
+        weights = 'DEFAULT' if pretrained_backbone else None
+        model = getattr(models, arch)(weights=weights)
+        model.fc = spoilage_head(model.fc.in_features)
+    elif arch in ('mobilenet_v3_large', 'mobilenet_v3_small'):
+        weights = 'DEFAULT' if pretrained_backbone else None
+        model = getattr(models, arch)(weights=weights)
+        model.classifier = spoilage_head(model.classifier[0].in_features)
+    else:
+        raise ValueError(f"Unsupported spoilage architecture '{arch}'")
+    return model
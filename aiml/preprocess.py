@@ -0,0 +1,141 @@
+""" Vectorized crop preprocessing for the spoilage CNN.
+    Replaces the per-crop BGR -> RGB -> PIL -> Resize/ToTensor/Normalize chain:
+    crops are resized with OpenCV straight into a preallocated uint8 batch and the
+    channel swap + mean/std normalization happen in one pass into a preallocated
+    float batch tensor.
+
+    Run `python preprocess.py` to check parity against the torchvision transform
+    (tests/test_preprocess.py runs the same check under pytest).
+"""
+import glob
+import sys
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Parity tolerances against torchvision, in normalized units (after mean/std; ~0.018
+# is one grey level). OpenCV's box (INTER_AREA) and PIL's triangle downscale kernels
+# differ on sharp edges, so single pixels of large downscales drift more than the mean.
+PARITY_MEAN_ABS_TOLERANCE = 0.03
+PARITY_MAX_ABS_TOLERANCE = 1.25
+
+
+class CropPreprocessor:
+    def __init__(self, size=224, mean=IMAGENET_MEAN, std=IMAGENET_STD, max_batch_size=32):
+        self.size = (size, size) if isinstance(size, int) else tuple(size)
+        self.max_batch_size = max(1, int(max_batch_size))
+        # (x / 255 - mean) / std == (x - 255 * mean) / (255 * std)
+        self._shift = torch.tensor([255.0 * m for m in mean], dtype=torch.float32).view(1, 3, 1, 1)
+        self._scale = torch.tensor([1.0 / (255.0 * s) for s in std], dtype=torch.float32).view(1, 3, 1, 1)
+        # Buffers are per thread so concurrent inference threads never share them
+        self._local = threading.local()
+
+    def _buffers(self, n):
+        local = self._local
+        if getattr(local, "capacity", 0) < n:
+            h, w = self.size
+            capacity = max(n, self.max_batch_size)
+            local.pixels = np.empty((capacity, h, w, 3), dtype=np.uint8)
+            local.batch = torch.empty((capacity, 3, h, w), dtype=torch.float32)
+            local.capacity = capacity
+        return local.pixels, local.batch
+
+    def __call__(self, crops, bgr=True):
+        """
+        Turn a list of HxWx3 uint8 crops into a normalized (N, 3, H, W) float tensor.
+        The returned tensor is a view of this thread's buffer and stays valid
+        until the next call from the same thread.
+        """
+        n = len(crops)
+        h, w = self.size
+        pixels, batch = self._buffers(n)
+
+        for i, crop in enumerate(crops):
+            crop_h, crop_w = crop.shape[:2]
+            if crop_h > h and crop_w > w:
+                # INTER_AREA is the closest OpenCV match to PIL's antialiased downscale
+                cv2.resize(crop, (w, h), dst=pixels[i], interpolation=cv2.INTER_AREA)
+            elif crop_h > h or crop_w > w:
+                # Long thin crops shrink on one axis and grow on the other; INTER_AREA
+                # upscales close to nearest-neighbour, so each axis gets its own pass
+                crop = cv2.resize(crop, (min(w, crop_w), min(h, crop_h)), interpolation=cv2.INTER_AREA)
+                cv2.resize(crop, (w, h), dst=pixels[i], interpolation=cv2.INTER_LINEAR)
+            else:
+                cv2.resize(crop, (w, h), dst=pixels[i], interpolation=cv2.INTER_LINEAR)
+
+        src = torch.from_numpy(pixels[:n]).permute(0, 3, 1, 2)
+        out = batch[:n]
+        order = (2, 1, 0) if bgr else (0, 1, 2)
+        for channel, source_channel in enumerate(order):
+            out[:, channel].copy_(src[:, source_channel])
+        out.sub_(self._shift).mul_(self._scale)
+        return out
+
+
+def reference_transform(size=224, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+    """The original torchvision/PIL preprocessing, kept as the parity reference."""
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize(list(mean), list(std))
+    ])
+
+
+def parity_report(crops, size=224):
+    """Compare CropPreprocessor with the torchvision transform on BGR crops."""
+    from PIL import Image
+
+    reference = reference_transform(size)
+    expected = torch.stack([reference(Image.fromarray(cv2.cvtColor(c, cv2.COLOR_BGR2RGB))) for c in crops])
+    actual = CropPreprocessor(size)(crops)
+    diff = (actual - expected).abs()
+    per_crop_mean = diff.flatten(1).mean(dim=1)
+    return {
+        "crops": len(crops),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "worst_crop_mean_abs_diff": float(per_crop_mean.max()),
+    }
+
+
+def _sample_crops(paths, seed=0):
+    rng = np.random.default_rng(seed)
+    crops = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        crops.append(image)
+        # Random sub-crops in the size range YOLO boxes usually have
+        for _ in range(4):
+            ch = int(rng.integers(min(h, 24), h + 1))
+            cw = int(rng.integers(min(w, 24), w + 1))
+            y = int(rng.integers(0, h - ch + 1))
+            x = int(rng.integers(0, w - cw + 1))
+            crops.append(image[y:y + ch, x:x + cw])
+    # Smooth synthetic crops, including small ones that need upscaling
+    for ch, cw in [(16, 16), (40, 90), (150, 120), (224, 224), (500, 300)]:
+        noise = rng.integers(0, 256, (ch, cw, 3), dtype=np.uint8)
+        crops.append(cv2.GaussianBlur(noise, (0, 0), 3))
+    return crops
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob("dataset/Validation_data/*"))
+    report = parity_report(_sample_crops(paths))
+    print(report)
+    if report["worst_crop_mean_abs_diff"] > PARITY_MEAN_ABS_TOLERANCE:
+        print(f"FAIL: mean abs diff above {PARITY_MEAN_ABS_TOLERANCE}")
+        sys.exit(1)
+    if report["max_abs_diff"] > PARITY_MAX_ABS_TOLERANCE:
+        print(f"FAIL: max abs diff above {PARITY_MAX_ABS_TOLERANCE}")
+        sys.exit(1)
+    print("OK")
@@ -0,0 +1,160 @@
+""" INT8 quantization of the spoilage CNN, with an accuracy-regression harness.
+    Static mode (the default) calibrates activation ranges on crops drawn from
+    aiml/dataset (FX graph mode, x86/fbgemm kernels) and quantizes the conv
+    backbone, which is where the CPU time goes. Dynamic mode only quantizes the
+    Linear head and leaves every conv in fp32: it is a size/accuracy baseline
+    and is not expected to run any faster. The harness compares the INT8 model with fp32 on held-out crops:
+    latency/throughput per batch size and how many fresh/rotten decisions
+    flip at the model's decision threshold (0.8 for the ResNet50 used by /detect).
+
+    The quantized model is saved as TorchScript and served with CNN_BACKEND=int8.
+
+    usage: python quantize_cnn.py [--mode static|dynamic] [--spoilage-model resnet50]
+                                  [--max-flip-rate 0.01] [--force]
+"""
+import argparse
+import copy
+import glob
+import os
+import sys
+
+import cv2
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from benchmark_backends import time_call
+from model_backends import EXPORT_DIR, QUANT_ENGINE, build_spoilage_cnn, cnn_export_path
+from model_registry import DEFAULT_SPOILAGE_MODEL, SPOILAGE_MODELS, get_spoilage_model
+from preprocess import CropPreprocessor
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+
+
+def dataset_crops(count, seed, root='dataset'):
+    """Random crops (with flips) of the dataset images, as BGR arrays."""
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(root, '**', pattern), recursive=True))
+    images = [img for img in (cv2.imread(p, cv2.IMREAD_COLOR) for p in paths) if img is not None]
+    if not images:
+        raise RuntimeError(f"No images found under {root}/")
+
+    rng = np.random.default_rng(seed)
+    crops = []
+    while len(crops) < count:
+        image = images[int(rng.integers(len(images)))]
+        h, w = image.shape[:2]
+        ch = int(rng.integers(max(1, h // 4), h + 1))
+        cw = int(rng.integers(max(1, w // 4), w + 1))
+        y = int(rng.integers(0, h - ch + 1))
+        x = int(rng.integers(0, w - cw + 1))
+        crop = image[y:y + ch, x:x + cw]
+        if rng.random() < 0.5:
+            crop = crop[:, ::-1]
+        crops.append(np.ascontiguousarray(crop))
+    return crops
+
+
+def to_batches(crops, spec, batch_size=16):
+    preprocess = CropPreprocessor(spec['input_size'], spec['mean'], spec['std'], max_batch_size=batch_size)
+    return [preprocess(crops[i:i + batch_size]).clone() for i in range(0, len(crops), batch_size)]
+
+
+def quantize_static(model, calibration_batches):
+    torch.backends.quantized.engine = QUANT_ENGINE
+    example = calibration_batches[0][:1]
+    prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping(QUANT_ENGINE), example_inputs=(example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def quantize_dynamic_linear(model):
+    """INT8 weights for the Linear head only; the conv backbone stays fp32, so expect no CPU speedup."""
+    torch.backends.quantized.engine = QUANT_ENGINE
+    return quantize_dynamic(copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def compare_scores(fp32_model, int8_model, batches, threshold):
+    """Score drift and decision flips of int8_model against fp32_model at the model's threshold."""
+    with torch.no_grad():
+        reference = torch.cat([fp32_model(b).view(-1) for b in batches])
+        quantized = torch.cat([int8_model(b).view(-1) for b in batches])
+    flips = (reference > threshold) != (quantized > threshold)
+    diff = (quantized - reference).abs()
+    return {
+        "samples": len(reference),
+        "decision_flips": int(flips.sum()),
+        "flip_rate": float(flips.float().mean()),
+        "fresh_to_rotten": int((flips & (quantized > threshold)).sum()),
+        "rotten_to_fresh": int((flips & (reference > threshold)).sum()),
+        "mean_abs_score_diff": float(diff.mean()),
+        "max_abs_score_diff": float(diff.max()),
+    }
+
+
+def benchmark(fp32_model, int8_model, batch_sizes, iters, input_size):
+    inputs = torch.randn(max(batch_sizes), 3, input_size, input_size)
+    print(f"  {'batch':>5} {'fp32 ms':>9} {'int8 ms':>9} {'fp32 img/s':>11} {'int8 img/s':>11} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        batch = inputs[:batch_size]
+        with torch.no_grad():
+            fp32_ms, _ = time_call(lambda: fp32_model(batch), iters)
+            int8_ms, _ = time_call(lambda: int8_model(batch), iters)
+        print(f"  {batch_size:>5} {fp32_ms:>9.1f} {int8_ms:>9.1f} {batch_size / fp32_ms * 1000:>11.1f} "
+              f"{batch_size / int8_ms * 1000:>11.1f} {fp32_ms / int8_ms:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the spoilage CNN to INT8 and measure the regression")
+    parser.add_argument('--mode', choices=['static', 'dynamic'], default='static',
+                        help="static: calibrated INT8 convs and head (the speedup path). "
+                             "dynamic: INT8 Linear head only, a size/accuracy baseline with no expected CPU speedup")
+    parser.add_argument('--spoilage-model', choices=sorted(SPOILAGE_MODELS), default=DEFAULT_SPOILAGE_MODEL)
+    parser.add_argument('--calibration-size', type=int, default=128)
+    parser.add_argument('--eval-size', type=int, default=256)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--iters', type=int, default=10)
+    parser.add_argument('--max-flip-rate', type=float, default=0.01,
+                        help="refuse to save the INT8 model if more decisions flip than this")
+    parser.add_argument('--force', action='store_true', help="save even if the flip rate is above the limit")
+    args = parser.parse_args()
+
+    spec = get_spoilage_model(args.spoilage_model)
+    fp32_model = build_spoilage_cnn(spec)
+    # Different seeds keep the calibration and evaluation crops disjoint in practice
+    calibration = to_batches(dataset_crops(args.calibration_size, seed=0), spec)
+    evaluation = to_batches(dataset_crops(args.eval_size, seed=1), spec)
+
+    print(f"Quantizing spoilage CNN {spec['name']} ({args.mode}, engine={QUANT_ENGINE})...")
+    if args.mode == 'static':
+        int8_model = quantize_static(fp32_model, calibration)
+    else:
+        print("Dynamic mode quantizes only the Linear head; the conv backbone stays fp32, so expect no speedup")
+        int8_model = quantize_dynamic_linear(fp32_model)
+
+    example = calibration[0][:1]
+    with torch.no_grad():
+        int8_model = torch.jit.freeze(torch.jit.trace(int8_model, example))
+
+    print("\nAccuracy vs fp32 (held-out dataset crops)")
+    report = compare_scores(fp32_model, int8_model, evaluation, spec['threshold'])
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+    print("\nLatency / throughput")
+    benchmark(fp32_model, int8_model, args.batch_sizes, args.iters, spec['input_size'])
+
+    if report["flip_rate"] > args.max_flip_rate and not args.force:
+        print(f"\nFlip rate {report['flip_rate']:.2%} is above {args.max_flip_rate:.2%}; not saving (use --force)")
+        sys.exit(1)
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = cnn_export_path('int8', spec['export_name'])
+    int8_model.save(path)
+    print(f"\nSaved INT8 model: {path} (serve with CNN_BACKEND=int8)")
+
+
+if __name__ == '__main__':
+    main()
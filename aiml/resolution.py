@@ -0,0 +1,103 @@
+""" Adaptive input resolution for /ws/video.
+    Each connection gets a latency budget. The controller walks a ladder of
+    (YOLO input size, CNN crop size) levels: it steps down when the smoothed
+    per-frame latency goes over budget or more frames wait in the scheduler
+    than one round takes, and back up once latency is well under budget and
+    the node is not overloaded.
+    Steps alternate between the CNN and YOLO sizes, and a change is held for
+    a few frames so the level does not oscillate.
+"""
+
+
+def parse_sizes(spec):
+    """'320,480,640' -> (320, 480, 640)"""
+    return tuple(sorted({int(part) for part in spec.split(',') if part.strip()}))
+
+
+def resolution_ladder(yolo_sizes, cnn_sizes):
+    """Levels from the smallest to the largest (yolo, cnn) pair, one size changing per step."""
+    yolo, cnn = len(yolo_sizes) - 1, len(cnn_sizes) - 1
+    levels = [(yolo_sizes[yolo], cnn_sizes[cnn])]
+    step_cnn = True
+    while yolo > 0 or cnn > 0:
+        # Cheaper CNN crops first; shrinking YOLO input costs more recall
+        if (step_cnn and cnn > 0) or yolo == 0:
+            cnn -= 1
+        else:
+            yolo -= 1
+        step_cnn = not step_cnn
+        levels.append((yolo_sizes[yolo], cnn_sizes[cnn]))
+    return levels[::-1]
+
+
+class ResolutionController:
+    def __init__(self, yolo_sizes, cnn_sizes, budget_ms=250.0, max_queue=8, smoothing=0.3,
+                 hold_frames=10, headroom=0.6):
+        """
+        max_queue: frames waiting in the scheduler above which the node counts as overloaded.
+        headroom: step back up only while latency is below this fraction of the budget.
+        hold_frames: processed frames between two changes.
+        """
+        self.levels = resolution_ladder(yolo_sizes, cnn_sizes)
+        self.level = len(self.levels) - 1
+        self.budget_ms = budget_ms
+        self.max_queue = max_queue
+        self.smoothing = smoothing
+        self.hold_frames = hold_frames
+        self.headroom = headroom
+
+        self.latency_ms = None
+        self._since_change = 0
+        self.steps_down = 0
+        self.steps_up = 0
+
+    @property
+    def yolo_size(self):
+        return self.levels[self.level][0]
+
+    @property
+    def cnn_size(self):
+        return self.levels[self.level][1]
+
+    def observe(self, latency_ms, queue_depth=0):
+        """Feed one processed frame's latency and the scheduler backlog; may change the level."""
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = self.smoothing * latency_ms + (1 - self.smoothing) * self.latency_ms
+        self._since_change += 1
+        if self._since_change < self.hold_frames:
+            return
+
+        if (self.latency_ms > self.budget_ms or queue_depth > self.max_queue) and self.level > 0:
+            self.level -= 1
+            self.steps_down += 1
+            self._since_change = 0
+        elif (self.latency_ms < self.budget_ms * self.headroom and queue_depth <= self.max_queue
+              and self.level < len(self.levels) - 1):
+            self.level += 1
+            self.steps_up += 1
+            self._since_change = 0
+
+    def current(self):
+        return {"yolo": self.yolo_size, "cnn": self.cnn_size}
+
+    def stats(self):
+        return {
+            **self.current(),
+            "level": self.level,
+            "levels": len(self.levels),
+            "budget_ms": self.budget_ms,
+            "smoothed_latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "steps_down": self.steps_down,
+            "steps_up": self.steps_up,
+        }
+
+
+if __name__ == '__main__':
+    controller = ResolutionController((320, 480, 640), (160, 192, 224), budget_ms=100, hold_frames=2)
+    print("ladder", controller.levels)
+    for latency in [300] * 12 + [20] * 14:
+        controller.observe(latency)
+    print(controller.stats())
+    assert controller.level == len(controller.levels) - 1 and controller.steps_down == len(controller.levels) - 1
@@ -0,0 +1,115 @@
+""" Content-addressed cache for /detect results.
+    Entries are keyed on a SHA-256 of the uploaded bytes, or, in perceptual mode,
+    on a 64-bit difference hash of the decoded image so re-encoded or slightly
+    changed photos of the same shelf also hit. The cache is an LRU bounded by
+    entry count and approximate memory, with a TTL per entry.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(frame):
+    """64-bit dHash of a BGR frame: sign of horizontal gradients on a 9x8 thumbnail."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class DetectionCache:
+    def __init__(self, max_entries=1024, ttl_seconds=300, max_bytes=32 * 1024 * 1024, max_distance=4):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        # Perceptual mode only: max differing hash bits to count as the same image
+        self.max_distance = max_distance
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _find(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None and isinstance(key, int) and self.max_distance > 0:
+            # Near-duplicate lookup: closest perceptual hash within max_distance
+            best = None
+            for other in self._entries:
+                distance = hamming_distance(key, other)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, other)
+            if best is not None:
+                key = best[1]
+                entry = self._entries[key]
+        if entry is not None and entry[2] < now:
+            self._drop(key)
+            self.expirations += 1
+            return None, None
+        return key, entry
+
+    def get(self, key):
+        with self._lock:
+            found, entry = self._find(key, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(found)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
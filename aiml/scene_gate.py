@@ -0,0 +1,65 @@
+""" Scene-change gate for /ws/video.
+    Frames are reduced to a small grayscale thumbnail. A frame only goes through
+    YOLO and the CNN when enough thumbnail pixels differ from the last frame
+    that did, or when the forced-refresh interval has passed; otherwise the
+    previous result is reused. Comparing against the last processed frame
+    (not the previous one) means slow drift still triggers a refresh.
+"""
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = (128, 72)
+
+
+def frame_signature(frame, size=SIGNATURE_SIZE):
+    """Small grayscale thumbnail of a BGR frame (module-level so process pools can run it)."""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+class SceneChangeGate:
+    def __init__(self, threshold=0.02, pixel_delta=12, refresh_frames=30):
+        """
+        threshold: fraction of thumbnail pixels that must change to count as a new scene.
+        pixel_delta: gray-level difference for a pixel to count as changed (absorbs sensor/JPEG noise).
+        refresh_frames: process at least every this many frames even on a static scene.
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.refresh_frames = refresh_frames
+
+        self._reference = None
+        self._since_processed = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_change = None
+
+    def should_process(self, signature):
+        """True if this frame needs inference; it then becomes the new reference."""
+        self.frames += 1
+        if self._reference is None or self._reference.shape != signature.shape:
+            self.last_change = None
+        else:
+            diff = cv2.absdiff(signature, self._reference)
+            self.last_change = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+            if self.last_change < self.threshold and self._since_processed + 1 < self.refresh_frames:
+                self._since_processed += 1
+                self.skipped += 1
+                return False
+        self._reference = signature
+        self._since_processed = 0
+        return True
+
+    def reset(self):
+        """Force the next frame through (e.g. after a failed inference)."""
+        self._reference = None
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 4) if self.frames else 0.0,
+            "last_change": round(self.last_change, 4) if self.last_change is not None else None,
+            "threshold": self.threshold,
+            "refresh_frames": self.refresh_frames,
+        }
@@ -0,0 +1,183 @@
+""" Prefork launcher: load the models once, then fork uvicorn workers that share them.
+    The parent loads YOLO and the spoilage CNN, freezes the weights, moves torch
+    tensors into shared memory and freezes the GC heap before forking, so the
+    weight pages are shared by all workers instead of being copied per process.
+    Each worker warms up and serves on the inherited listening socket.
+    Linux only (fork + /proc).
+
+    usage: python serve_prefork.py [--workers N] [--threads T] [--interop-threads 1] [--pin]
+                                   [--host 0.0.0.0] [--port 8000] [--report-after 60]
+    Send SIGUSR1 to the parent to print the per-worker memory report.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import torch
+
+
+def freeze_module(module):
+    """Inference-only weights in shared memory, so no worker ever writes to them."""
+    if isinstance(module, torch.nn.Module):
+        for param in module.parameters():
+            param.requires_grad_(False)
+        module.share_memory()
+
+
+def freeze_models(app_module):
+    freeze_module(app_module.model)
+    yolo = app_module.yolo_model
+    # ultralytics keeps the torch network on .model (eager / TorchScript backends)
+    freeze_module(getattr(yolo, 'model', None))
+    # Objects alive now are never collected in the workers, so GC does not touch their pages
+    gc.collect()
+    gc.freeze()
+
+
+def read_smaps_rollup(pid):
+    """Memory counters (kB) for a process from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def memory_report(parent_pid, worker_pids):
+    """
+    RSS counts shared pages in every process; USS (private pages) is what each
+    extra worker really costs and PSS splits shared pages between the sharers.
+    """
+    rows = []
+    for role, pid in [('parent', parent_pid)] + [('worker', pid) for pid in worker_pids]:
+        try:
+            m = read_smaps_rollup(pid)
+        except OSError:
+            continue
+        uss = m.get('Private_Clean', 0) + m.get('Private_Dirty', 0)
+        shared = m.get('Shared_Clean', 0) + m.get('Shared_Dirty', 0)
+        rows.append((role, pid, m.get('Rss', 0), m.get('Pss', 0), uss, shared))
+
+    print(f"\n{'role':<7} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9} {'shared MB':>10}")
+    for role, pid, rss, pss, uss, shared in rows:
+        print(f"{role:<7} {pid:>8} {rss / 1024:>9.1f} {pss / 1024:>9.1f} {uss / 1024:>9.1f} {shared / 1024:>10.1f}")
+    total_pss = sum(r[3] for r in rows)
+    total_rss = sum(r[2] for r in rows)
+    print(f"total PSS {total_pss / 1024:.1f} MB (sum of RSS would claim {total_rss / 1024:.1f} MB)\n")
+    sys.stdout.flush()
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app_module, sock, log_level, cpus=None):
+    import uvicorn
+    import workers
+
+    if cpus:
+        settings = workers.configure_threads(cpus=cpus)
+        print(f"Worker {os.getpid()} pinned: {settings}")
+
+    # Drop the supervisor's handlers; uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    config = uvicorn.Config(app_module.app, log_level=log_level, lifespan='on')
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve app.py with forked workers sharing model weights")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, help="torch intra-op threads per worker (TORCH_THREADS)")
+    parser.add_argument('--interop-threads', type=int, help="torch inter-op threads per worker (TORCH_INTEROP_THREADS)")
+    parser.add_argument('--pin', action='store_true',
+                        help="pin each worker to its own slice of the CPUs (threads default to the slice size)")
+    parser.add_argument('--log-level', default='info')
+    parser.add_argument('--report-after', type=float, default=0,
+                        help="print the memory report this many seconds after start (0 = only on SIGUSR1)")
+    args = parser.parse_args()
+
+    # app.py applies these at import, before the workers inherit them
+    if args.threads:
+        os.environ['TORCH_THREADS'] = str(args.threads)
+    if args.interop_threads:
+        os.environ['TORCH_INTEROP_THREADS'] = str(args.interop_threads)
+    import app as app_module
+    import workers as worker_config
+
+    print("Preloading models in the parent...")
+    app_module.preload_models()
+    freeze_models(app_module)
+
+    sock = bind_socket(args.host, args.port)
+    workers = {}
+    shutting_down = False
+
+    def spawn(index):
+        cpus = worker_config.worker_cpus(index, args.workers) if args.pin else None
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app_module, sock, args.log_level, cpus)
+            finally:
+                os._exit(0)
+        workers[pid] = index
+        print(f"Started worker {pid}")
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: memory_report(os.getpid(), list(workers)))
+
+    for index in range(args.workers):
+        spawn(index)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers "
+          f"(kill -USR1 {os.getpid()} for a memory report)")
+
+    report_at = time.time() + args.report_after if args.report_after > 0 else None
+    while workers:
+        if report_at is not None and time.time() >= report_at:
+            memory_report(os.getpid(), list(workers))
+            report_at = None
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        index = workers.pop(pid, None)
+        if not shutting_down and index is not None:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            spawn(index)
+
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+""" pytest setup for the aiml service modules.
+    They are flat modules imported by name (as uvicorn runs them from aiml/) and
+    load models and datasets by relative path, so tests run from aiml/ too.
+"""
+import os
+import sys
+
+import pytest
+
+AIML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AIML_DIR)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def aiml_cwd():
+    # Session-scoped so module-scoped fixtures (models, dataset crops) already see aiml/
+    previous = os.getcwd()
+    os.chdir(AIML_DIR)
+    yield
+    os.chdir(previous)
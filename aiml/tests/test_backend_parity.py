@@ -0,0 +1,38 @@
+""" Exported CNN backends must score like eager PyTorch (the comparison behind
+    benchmark_backends.py --check), at the input size of the configured
+    SPOILAGE_MODEL. Backends whose export or runtime is missing are skipped.
+"""
+import os
+
+import pytest
+import torch
+
+from benchmark_backends import cnn_inputs, cnn_tolerance, compare_cnn
+from model_backends import CNN_BACKENDS, load_cnn
+from model_registry import DEFAULT_SPOILAGE_MODEL, get_spoilage_model
+
+SPEC = get_spoilage_model(os.getenv("SPOILAGE_MODEL", DEFAULT_SPOILAGE_MODEL))
+
+
+@pytest.fixture(scope="module")
+def eager_model():
+    try:
+        return load_cnn('eager', torch.device('cpu'), SPEC)
+    except Exception as e:
+        pytest.skip(f"eager {SPEC['name']} weights not available: {e}")
+
+
+def test_inputs_follow_registry_input_size():
+    for name in ('resnet50', 'mobilenet_v3_small'):
+        spec = get_spoilage_model(name)
+        assert cnn_inputs(spec, 2).shape == (2, 3, spec['input_size'], spec['input_size'])
+
+
+@pytest.mark.parametrize("backend", [b for b in CNN_BACKENDS if b != 'eager'])
+def test_cnn_backend_matches_eager(backend, eager_model):
+    try:
+        model = load_cnn(backend, torch.device('cpu'), SPEC)
+    except Exception as e:
+        pytest.skip(f"{backend} export of {SPEC['name']} not available: {e}")
+    max_diff, flips = compare_cnn(model, eager_model, cnn_inputs(SPEC, 8), SPEC['threshold'])
+    assert max_diff <= cnn_tolerance(backend), f"{backend} drifts by {max_diff:.2e} ({flips} decisions flipped)"
@@ -0,0 +1,13 @@
+""" Ring slots held by a dead inference process go back to the free list. """
+import queue
+
+from ingest_agent import reclaim_slots
+
+
+def test_reclaim_slots_returns_only_the_dead_workers_slots():
+    holders = [0, 1, 2, 1, 0, 2]  # slot -> worker index + 1
+    free_slots = queue.Queue()
+    assert reclaim_slots(holders, 0, free_slots) == 2
+    assert sorted(free_slots.get_nowait() for _ in range(2)) == [1, 3]
+    assert free_slots.empty()
+    assert holders == [0, 0, 2, 0, 0, 2]
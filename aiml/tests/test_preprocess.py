@@ -0,0 +1,55 @@
+""" CropPreprocessor must match the torchvision/PIL transform it replaced, on
+    crops cut from the validation images the way YOLO boxes cut them.
+"""
+import glob
+
+import cv2
+import numpy as np
+import pytest
+
+from preprocess import (PARITY_MAX_ABS_TOLERANCE, PARITY_MEAN_ABS_TOLERANCE, CropPreprocessor, _sample_crops,
+                        parity_report)
+
+# Upscaling uses bilinear interpolation on both sides; only rounding differs
+UPSCALE_MEAN_ABS_TOLERANCE = 0.005
+UPSCALE_MAX_ABS_TOLERANCE = 0.03
+
+
+@pytest.fixture(scope="module")
+def crops():
+    paths = sorted(glob.glob("dataset/Validation_data/*"))
+    if not paths:
+        pytest.skip("dataset/Validation_data is empty")
+    return _sample_crops(paths)
+
+
+def test_downscaled_crops_match_torchvision(crops):
+    downscaled = [c for c in crops if c.shape[0] > 224 or c.shape[1] > 224]
+    assert len(downscaled) >= 20
+    report = parity_report(downscaled)
+    assert report["worst_crop_mean_abs_diff"] <= PARITY_MEAN_ABS_TOLERANCE, report
+    assert report["max_abs_diff"] <= PARITY_MAX_ABS_TOLERANCE, report
+
+
+def test_upscaled_crops_match_torchvision(crops):
+    upscaled = [c for c in crops if c.shape[0] <= 224 and c.shape[1] <= 224]
+    report = parity_report(upscaled)
+    assert report["worst_crop_mean_abs_diff"] <= UPSCALE_MEAN_ABS_TOLERANCE, report
+    assert report["max_abs_diff"] <= UPSCALE_MAX_ABS_TOLERANCE, report
+
+
+def test_thin_crops_match_torchvision(crops):
+    # Shelf-edge boxes: one side shrinks while the other grows
+    image = max(crops, key=lambda c: c.size)
+    thin = [image[:40, :2000], image[:2000, :30], image[1000:1100, 500:3000]]
+    report = parity_report(thin)
+    assert report["worst_crop_mean_abs_diff"] <= PARITY_MEAN_ABS_TOLERANCE, report
+    assert report["max_abs_diff"] <= PARITY_MAX_ABS_TOLERANCE, report
+
+
+def test_batch_shape_and_rgb_order():
+    crop = np.zeros((50, 80, 3), dtype=np.uint8)
+    crop[..., 2] = 255  # pure red in BGR
+    batch = CropPreprocessor(160)([crop, cv2.flip(crop, 1)])
+    assert tuple(batch.shape) == (2, 3, 160, 160)
+    assert float(batch[:, 0].mean()) > 2.0 and float(batch[:, 2].mean()) < -1.5
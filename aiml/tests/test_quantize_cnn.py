@@ -0,0 +1,27 @@
+""" quantize_cnn.py must stay importable (it pulls helpers from benchmark_backends),
+    and its harness must judge decision flips at the configured model's threshold.
+"""
+import torch
+
+import quantize_cnn
+from model_registry import get_spoilage_model
+
+
+class FixedScores(torch.nn.Module):
+    def __init__(self, offset):
+        super().__init__()
+        self.offset = offset
+
+    def forward(self, x):
+        return x.mean(dim=(1, 2, 3)) + self.offset
+
+
+def test_compare_scores_uses_model_threshold():
+    spec = get_spoilage_model('resnet50')
+    # Scores straddle the threshold, so a small offset flips exactly the ones just below it
+    batches = [torch.full((1, 3, 2, 2), spec['threshold'] + d) for d in (-0.3, -0.01, 0.01, 0.3)]
+    report = quantize_cnn.compare_scores(FixedScores(0.0), FixedScores(0.02), batches, spec['threshold'])
+    assert report["samples"] == 4
+    assert report["decision_flips"] == 1
+    assert report["fresh_to_rotten"] == 1
+    assert report["rotten_to_fresh"] == 0
@@ -0,0 +1,21 @@
+""" tile_grid must terminate and cover the frame for any TILE_MAX_TILES / TILE_SIZE. """
+import pytest
+
+from tiling import tile_grid
+
+
+@pytest.mark.parametrize("max_tiles", [-3, 0, 1])
+def test_max_tiles_below_one_gives_a_single_tile(max_tiles):
+    assert tile_grid(3840, 2160, 640, 0.2, max_tiles) == [(0, 0, 3840, 2160)]
+
+
+@pytest.mark.parametrize("tile_size", [0, 1, 3])
+def test_tiny_tiles_still_grow_to_the_limit(tile_size):
+    tiles = tile_grid(1920, 1080, tile_size, 0.2, 12)
+    assert 1 <= len(tiles) <= 12
+    assert max(x1 for _, _, x1, _ in tiles) == 1920
+    assert max(y1 for _, _, _, y1 in tiles) == 1080
+
+
+def test_grid_within_limit_is_unchanged():
+    assert len(tile_grid(3840, 2160, 640, 0.2, None)) == len(tile_grid(3840, 2160, 640, 0.2, 1000))
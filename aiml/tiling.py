@@ -0,0 +1,95 @@
+""" Sliced inference helpers for high-resolution shelf photos.
+    A large frame is cut into overlapping tiles that YOLO sees at (close to)
+    native resolution, so small apples are not lost to the 640px letterbox.
+    Tile detections are shifted back into frame coordinates and merged with
+    class-aware NMS across tiles.
+"""
+import numpy as np
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    starts = list(range(0, length - tile, stride))
+    # Last tile is aligned to the edge instead of running past it
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(width, height, tile_size=640, overlap=0.2, max_tiles=None):
+    """
+    (x0, y0, x1, y1) tiles covering a width x height frame, neighbours
+    overlapping by `overlap` of a tile. With max_tiles the tiles grow (YOLO then
+    downsamples them) until the grid fits, which bounds the batch per frame.
+    A max_tiles below 1 is treated as 1 (a single tile covering the frame).
+    """
+    if max_tiles is not None:
+        max_tiles = max(1, max_tiles)
+    tile_size = max(1, tile_size)
+    while True:
+        xs = _tile_starts(width, tile_size, overlap)
+        ys = _tile_starts(height, tile_size, overlap)
+        if max_tiles is None or len(xs) * len(ys) <= max_tiles:
+            break
+        tile_size = max(tile_size + 1, int(tile_size * 1.25))
+    tile_w = min(tile_size, width)
+    tile_h = min(tile_size, height)
+    return [(x, y, x + tile_w, y + tile_h) for y in ys for x in xs]
+
+
+def non_max_suppression(boxes, scores, class_ids, threshold=0.5, metric='ios'):
+    """
+    Greedy class-aware NMS; returns kept indices, best score first.
+    metric 'ios' (intersection over the smaller box) also drops an apple cut
+    by a tile edge in favour of its full view from the neighbouring tile,
+    which plain 'iou' usually keeps as a second box.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    areas = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for idx in np.argsort(-scores, kind='stable'):
+        if suppressed[idx]:
+            continue
+        keep.append(idx)
+        w = np.clip(np.minimum(boxes[idx, 2], boxes[:, 2]) - np.maximum(boxes[idx, 0], boxes[:, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[idx, 3], boxes[:, 3]) - np.maximum(boxes[idx, 1], boxes[:, 1]), 0, None)
+        inter = w * h
+        if metric == 'ios':
+            denom = np.minimum(areas[idx], areas)
+        else:
+            denom = areas[idx] + areas - inter
+        overlap = inter / np.maximum(denom, 1e-6)
+        suppressed |= (overlap > threshold) & (class_ids == class_ids[idx])
+    return np.array(keep, dtype=np.int64)
+
+
+def merge_tile_detections(results, offsets, threshold=0.5, metric='ios'):
+    """
+    Merge per-tile (boxes, confidences, class_ids) into one frame-level result.
+    offsets holds each tile's (x0, y0) in the frame.
+    """
+    boxes = [result[0][:, :4] + np.array([x, y, x, y], dtype=np.float32)
+             for result, (x, y) in zip(results, offsets)]
+    boxes = np.concatenate(boxes).astype(np.float32) if boxes else np.zeros((0, 4), np.float32)
+    confidences = np.concatenate([result[1] for result in results]) if results else np.zeros(0, np.float32)
+    class_ids = np.concatenate([result[2] for result in results]) if results else np.zeros(0, np.float32)
+
+    keep = non_max_suppression(boxes, confidences, class_ids, threshold, metric)
+    return boxes[keep], confidences[keep], class_ids[keep]
+
+
+if __name__ == '__main__':
+    grid = tile_grid(3840, 2160, 640, 0.2)
+    print(f"4K frame: {len(grid)} tiles of 640px, capped at 12: {len(tile_grid(3840, 2160, 640, 0.2, 12))} tiles")
+
+    # One apple (1000..1100, 400..500) straddling two tiles: full view in one, cut in the other
+    results = [
+        (np.array([[488, 400, 588, 500]], np.float32), np.array([0.9], np.float32), np.array([0.0], np.float32)),
+        (np.array([[0, 400, 76, 500]], np.float32), np.array([0.6], np.float32), np.array([0.0], np.float32)),
+    ]
+    boxes, confidences, _ = merge_tile_detections(results, [(512, 0), (1024, 0)])
+    assert len(boxes) == 1 and confidences[0] == np.float32(0.9), (boxes, confidences)
+    print(f"Cross-tile merge kept {boxes.tolist()}")
@@ -0,0 +1,175 @@
+""" Lightweight multi-object tracker for /ws/video (ByteTrack-style).
+    Each track runs a constant-velocity Kalman filter on its box. Detections
+    are associated by IoU in two stages: confident detections first, then the
+    low-confidence ones against the tracks still unmatched, which keeps an apple
+    tracked through a frame where YOLO is unsure of it. Tracks also carry the
+    spoilage score, so the CNN only runs on new tracks and on a periodic
+    refresh, and the label is smoothed across frames.
+"""
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def greedy_match(ious, threshold):
+    """Highest-IoU-first assignment; returns [(row, col)] pairs above threshold."""
+    matches = []
+    if ious.size == 0:
+        return matches
+    used_rows, used_cols = set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        row, col = np.unravel_index(flat, ious.shape)
+        if ious[row, col] < threshold:
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((int(row), int(col)))
+    return matches
+
+
+class KalmanBoxFilter:
+    """Constant-velocity Kalman filter on (cx, cy, w, h); noise scales with the box size."""
+    _motion = np.eye(8) + np.eye(8, k=4)
+    _observe = np.eye(4, 8)
+    _std_position = 1 / 20
+    _std_velocity = 1 / 160
+
+    def __init__(self, box):
+        self.mean = np.r_[self._to_cxcywh(box), np.zeros(4)]
+        size = max(self.mean[2], self.mean[3])
+        std = np.r_[[2 * self._std_position * size] * 4, [10 * self._std_velocity * size] * 4]
+        self.covariance = np.diag(np.square(std))
+
+    @staticmethod
+    def _to_cxcywh(box):
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+    def predict(self):
+        size = max(self.mean[2], self.mean[3])
+        std = np.r_[[self._std_position * size] * 4, [self._std_velocity * size] * 4]
+        self.mean = self._motion @ self.mean
+        self.covariance = self._motion @ self.covariance @ self._motion.T + np.diag(np.square(std))
+
+    def update(self, box):
+        size = max(self.mean[2], self.mean[3])
+        innovation_cov = self._observe @ self.covariance @ self._observe.T + np.diag(
+            np.square([self._std_position * size] * 4))
+        gain = self.covariance @ self._observe.T @ np.linalg.inv(innovation_cov)
+        self.mean = self.mean + gain @ (self._to_cxcywh(box) - self._observe @ self.mean)
+        self.covariance = (np.eye(8) - gain @ self._observe) @ self.covariance
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.mean[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.filter = KalmanBoxFilter(box)
+        self.last_seen = frame_index
+        self.hits = 1
+        self.score = None  # smoothed spoilage score
+        self.classified_at = None
+
+
+class IoUTracker:
+    def __init__(self, high_confidence=0.25, iou_threshold=0.3, low_iou_threshold=0.5,
+                 max_age=30, refresh_frames=30, smoothing=0.3):
+        """
+        high_confidence: detections at or above start tracks and match first.
+        max_age: frames a track survives without a match.
+        refresh_frames: re-run the classifier on a track this often.
+        smoothing: weight of a new score in the track's moving average.
+        """
+        self.high_confidence = high_confidence
+        self.iou_threshold = iou_threshold
+        self.low_iou_threshold = low_iou_threshold
+        self.max_age = max_age
+        self.refresh_frames = refresh_frames
+        self.smoothing = smoothing
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_id = 1
+        self.detections_seen = 0
+        self.classifications = 0
+
+    def update(self, boxes, confidences):
+        """
+        Advance one frame. Returns, for each detection, its Track, or None for
+        a low-confidence box that matched no existing track.
+        """
+        self.frame_index += 1
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        confidences = np.asarray(confidences, dtype=np.float64).reshape(-1)
+        for track in self.tracks:
+            track.filter.predict()
+
+        assigned = [None] * len(boxes)
+        high = [i for i in range(len(boxes)) if confidences[i] >= self.high_confidence]
+        low = [i for i in range(len(boxes)) if confidences[i] < self.high_confidence]
+        unmatched = list(self.tracks)
+
+        for candidates, threshold in ((high, self.iou_threshold), (low, self.low_iou_threshold)):
+            if not candidates or not unmatched:
+                continue
+            track_boxes = np.array([track.filter.box for track in unmatched])
+            matches = greedy_match(iou_matrix(track_boxes, boxes[candidates]), threshold)
+            for row, col in matches:
+                track, index = unmatched[row], candidates[col]
+                track.filter.update(boxes[index])
+                track.last_seen = self.frame_index
+                track.hits += 1
+                assigned[index] = track
+            matched_rows = {row for row, _ in matches}
+            unmatched = [track for row, track in enumerate(unmatched) if row not in matched_rows]
+
+        for index in high:
+            if assigned[index] is None:
+                track = Track(self._next_id, boxes[index], self.frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[index] = track
+
+        self.tracks = [track for track in self.tracks if self.frame_index - track.last_seen <= self.max_age]
+        self.detections_seen += sum(track is not None for track in assigned)
+        return assigned
+
+    def needs_classification(self, track):
+        return track.classified_at is None or self.frame_index - track.classified_at >= self.refresh_frames
+
+    def record_score(self, track, score):
+        """Fold a classifier score into the track's moving average; returns the smoothed score."""
+        self.classifications += 1
+        track.classified_at = self.frame_index
+        if track.score is None:
+            track.score = score
+        else:
+            track.score = self.smoothing * score + (1 - self.smoothing) * track.score
+        return track.score
+
+    def stats(self):
+        return {
+            "active_tracks": len(self.tracks),
+            "tracks_created": self._next_id - 1,
+            "tracked_detections": self.detections_seen,
+            "classifications": self.classifications,
+            "classified_fraction": round(self.classifications / self.detections_seen, 4) if self.detections_seen else 0.0,
+        }
@@ -0,0 +1,130 @@
+""" Train the fused detector: YOLO with fresh_apple / rotten_apple as its classes.
+    The current two-stage pipeline labels the data. The apple detector finds
+    the boxes and the spoilage CNN decides fresh/rotten for each box. Images in
+    freshapples/ or rottenapples/ folders can use their folder label instead
+    (--label-source folder). YOLO is then fine-tuned from the apple detector
+    weights, reusing its backbone, with a new two-class head. The result is
+    saved to models/trained/yolo_apple_fused.pt and served with FUSED_DETECTOR=1,
+    which drops the per-apple CNN pass.
+
+    usage: python train_fused_detector.py [--data dataset] [--epochs 30] [--imgsz 640]
+                                          [--label-source teacher|folder] [--device cpu]
+"""
+import argparse
+import glob
+import os
+import random
+import shutil
+
+import cv2
+import torch
+
+from model_backends import FUSED_CLASSES, FUSED_ROTTEN_CLASS, FUSED_YOLO_WEIGHTS, YOLO_WEIGHTS, build_spoilage_cnn
+from model_registry import DEFAULT_SPOILAGE_MODEL, SPOILAGE_MODELS, get_spoilage_model
+from preprocess import CropPreprocessor
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+FOLDER_LABELS = {'freshapples': 1 - FUSED_ROTTEN_CLASS, 'rottenapples': FUSED_ROTTEN_CLASS}
+
+
+def find_images(root):
+    return sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(root, '**', pattern), recursive=True))
+
+
+def pseudo_label(paths, detector, teacher, spec, det_conf, label_source):
+    """(path, [(class_id, x1, y1, x2, y2)], (width, height)) per image with at least one apple."""
+    preprocess = CropPreprocessor(spec['input_size'], spec['mean'], spec['std'])
+    labelled = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        boxes = detector(image, conf=det_conf, device='cpu', verbose=False)[0].boxes.xyxy.cpu().numpy()
+        boxes = [tuple(int(v) for v in box[:4]) for box in boxes]
+        boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2 in boxes if x2 > x1 and y2 > y1]
+        if not boxes:
+            continue
+
+        folder_label = FOLDER_LABELS.get(os.path.basename(os.path.dirname(path)))
+        if label_source == 'folder' and folder_label is not None:
+            classes = [folder_label] * len(boxes)
+        else:
+            crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+            with torch.no_grad():
+                scores = teacher(preprocess(crops)).view(-1).tolist()
+            classes = [FUSED_ROTTEN_CLASS if score > spec['threshold'] else 1 - FUSED_ROTTEN_CLASS for score in scores]
+        labelled.append((path, [(c,) + box for c, box in zip(classes, boxes)], (width, height)))
+    return labelled
+
+
+def write_yolo_dataset(labelled, out_dir, val_fraction):
+    shutil.rmtree(out_dir, ignore_errors=True)
+    random.Random(0).shuffle(labelled)
+    n_val = max(1, int(len(labelled) * val_fraction)) if len(labelled) > 1 else 0
+    splits = {'val': labelled[:n_val] or labelled, 'train': labelled[n_val:] or labelled}
+
+    for split, items in splits.items():
+        os.makedirs(os.path.join(out_dir, 'images', split), exist_ok=True)
+        os.makedirs(os.path.join(out_dir, 'labels', split), exist_ok=True)
+        for i, (path, boxes, (width, height)) in enumerate(items):
+            # Index prefix keeps names unique across class folders
+            stem = f"{i:05d}_{os.path.splitext(os.path.basename(path))[0]}"
+            shutil.copy(path, os.path.join(out_dir, 'images', split, stem + os.path.splitext(path)[1]))
+            with open(os.path.join(out_dir, 'labels', split, stem + '.txt'), 'w') as f:
+                for class_id, x1, y1, x2, y2 in boxes:
+                    f.write(f"{class_id} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                            f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n")
+
+    data_yaml = os.path.join(out_dir, 'data.yaml')
+    with open(data_yaml, 'w') as f:
+        f.write(f"path: {os.path.abspath(out_dir)}\ntrain: images/train\nval: images/val\n")
+        f.write(f"nc: {len(FUSED_CLASSES)}\nnames: {list(FUSED_CLASSES)}\n")
+    return data_yaml, {split: len(items) for split, items in splits.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train YOLO with fresh/rotten classes from the two-stage pipeline")
+    parser.add_argument('--data', default='dataset')
+    parser.add_argument('--out', default='fused_dataset', help="where the generated YOLO dataset is written")
+    parser.add_argument('--label-source', choices=['teacher', 'folder'], default='teacher')
+    parser.add_argument('--spoilage-model', choices=sorted(SPOILAGE_MODELS), default=DEFAULT_SPOILAGE_MODEL)
+    parser.add_argument('--det-conf', type=float, default=0.5, help="detector confidence for pseudo-label boxes")
+    parser.add_argument('--val-fraction', type=float, default=0.1)
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--output', default=FUSED_YOLO_WEIGHTS)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    spec = get_spoilage_model(args.spoilage_model)
+    paths = find_images(args.data)
+    if not paths:
+        raise SystemExit(f"No images found under {args.data}/")
+
+    print(f"Labelling {len(paths)} images with the apple detector + {spec['name']} ({args.label_source} labels)...")
+    labelled = pseudo_label(paths, YOLO(YOLO_WEIGHTS), build_spoilage_cnn(spec), spec, args.det_conf, args.label_source)
+    if not labelled:
+        raise SystemExit("The detector found no apples to label; lower --det-conf")
+    data_yaml, counts = write_yolo_dataset(labelled, args.out, args.val_fraction)
+    boxes = [c for _, items, _ in labelled for c, *_ in items]
+    print(f"Dataset {data_yaml}: {counts['train']} train / {counts['val']} val images, "
+          f"{boxes.count(FUSED_ROTTEN_CLASS)} rotten / {len(boxes) - boxes.count(FUSED_ROTTEN_CLASS)} fresh boxes")
+
+    # Start from the apple detector: the backbone and box regression carry over, the class head is rebuilt for nc=2
+    model = YOLO(YOLO_WEIGHTS)
+    model.train(data=data_yaml, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch, device=args.device,
+                project='runs/fused', name='train', exist_ok=True)
+
+    best = model.trainer.best if os.path.exists(model.trainer.best) else model.trainer.last
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    shutil.copy(best, args.output)
+    print(f"Saved fused detector to {args.output} (serve with FUSED_DETECTOR=1, "
+          f"export with python export_models.py --models fused)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+""" Server-side video ingestion for /detect_video.
+    Recorded footage (an uploaded file) or a stream URL is decoded with
+    cv2.VideoCapture one frame at a time. Only every stride-th frame inside the
+    requested time range is retrieved; the others are grabbed and discarded, so
+    memory stays at one chunk of frames however long the video is.
+
+    As a CLI this streams a local file (uploaded) or a stream URL (decoded by
+    the server) through a running API and prints the NDJSON results:
+
+    usage: python video_ingest.py <video-file-or-url> [--server http://localhost:8000]
+                                  [--stride 5] [--start 0] [--end 60] [--conf 0.5] [--out results.ndjson]
+"""
+import argparse
+import os
+import sys
+
+import cv2
+
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+
+def is_stream_url(source):
+    return source.lower().startswith(STREAM_SCHEMES)
+
+
+def open_video(source):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        capture.release()
+        raise ValueError("Could not open video source")
+    return capture
+
+
+def video_info(capture):
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    return {
+        "fps": round(fps, 3),
+        "frame_count": frames if frames > 0 else None,  # unknown for live streams
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+
+
+def iter_video_frames(capture, stride=1, start_s=0.0, end_s=None):
+    """
+    Yield (frame_index, timestamp_ms, frame) for every stride-th frame between
+    start_s and end_s (seconds). Files seek straight to start_s; streams that
+    cannot seek read up to it.
+    """
+    stride = max(1, int(stride))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    if start_s > 0:
+        capture.set(cv2.CAP_PROP_POS_MSEC, start_s * 1000)
+    index = int(capture.get(cv2.CAP_PROP_POS_FRAMES) or 0)
+    in_range = 0
+
+    while capture.grab():
+        timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+        if timestamp_ms <= 0 and index > 0 and fps > 0:
+            # Some streams report no position; fall back to the frame rate
+            timestamp_ms = index * 1000 / fps
+        frame_index = index
+        index += 1
+
+        if timestamp_ms < start_s * 1000:
+            continue
+        if end_s is not None and timestamp_ms > end_s * 1000:
+            return
+        in_range += 1
+        if (in_range - 1) % stride:
+            continue
+
+        ok, frame = capture.retrieve()
+        if ok and frame is not None:
+            yield frame_index, round(timestamp_ms, 1), frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run recorded shelf footage through /detect_video")
+    parser.add_argument('source', help="video file to upload, or a stream URL for the server to read")
+    parser.add_argument('--server', default=os.getenv("RESQCART_API", "http://localhost:8000"))
+    parser.add_argument('--stride', type=int, default=5, help="run every Nth frame")
+    parser.add_argument('--start', type=float, default=0.0, help="seconds into the video")
+    parser.add_argument('--end', type=float, default=None, help="stop after this many seconds into the video")
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--out', default=None, help="write NDJSON here instead of stdout")
+    args = parser.parse_args()
+
+    import requests
+
+    data = {"stride": args.stride, "start": args.start, "conf": args.conf}
+    if args.end is not None:
+        data["end"] = args.end
+    url = args.server.rstrip('/') + '/detect_video'
+
+    out = open(args.out, 'w') if args.out else sys.stdout
+    try:
+        if is_stream_url(args.source):
+            response = requests.post(url, data=dict(data, url=args.source), stream=True)
+        else:
+            with open(args.source, 'rb') as f:
+                response = requests.post(url, data=data, files={"file": (os.path.basename(args.source), f)},
+                                         stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                out.write(line + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
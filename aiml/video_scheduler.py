@@ -0,0 +1,137 @@
+""" Shared inference scheduler for /ws/video.
+    Connections no longer run the models themselves: their receive tasks park
+    the newest frame in the session mailbox and the scheduler decides whose
+    frame runs next. Sessions are served in start-time fair queuing order
+    (each served frame advances a session's virtual time by 1 / weight), so a
+    busy camera cannot starve a quiet one and priority cameras get a larger
+    share. A per-session FPS cap holds frames back (newer ones replace them in
+    the mailbox), and up to max_batch sessions are taken per round so one YOLO
+    call serves several cameras.
+"""
+import asyncio
+import time
+from collections import Counter
+
+
+class VideoScheduler:
+    def __init__(self, process_batch, max_batch=8, max_in_flight=2, log=print):
+        """
+        process_batch: async callable taking [(item, session)] for one round; it
+            runs the models and sends the results.
+        max_in_flight: rounds processed concurrently (decode/postprocess of one
+            round overlaps with inference of the next).
+        log: called with the message when a round fails.
+        """
+        self.process_batch = process_batch
+        self.log = log
+        self.max_batch = max(1, int(max_batch))
+        self.max_in_flight = max(1, int(max_in_flight))
+
+        self.sessions = []
+        self._virtual_time = 0.0
+        self._running = 0
+        self._rounds = set()
+        self._wakeup = None
+        self._task = None
+
+        self.rounds_run = 0
+        self.frames_run = 0
+        self._round_sizes = Counter()
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def add(self, session):
+        """Register a session; it starts at the current virtual time, with no credit for time it wasn't connected."""
+        self._ensure_task()
+        session.virtual_time = self._virtual_time
+        self.sessions.append(session)
+
+    def remove(self, session):
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    def notify(self):
+        """Called when a session's mailbox gets a frame."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._rounds):
+            task.cancel()
+
+    def queue_depth(self):
+        """Sessions with a frame waiting that is not being processed yet."""
+        return sum(1 for s in self.sessions if s.mailbox.pending and not s.in_flight)
+
+    def _ready(self, now):
+        return [s for s in self.sessions if s.mailbox.pending and not s.in_flight and now >= s.next_frame_at]
+
+    def _pick(self, now):
+        ready = sorted(self._ready(now), key=lambda s: (s.virtual_time, -s.weight))[:self.max_batch]
+        if not ready:
+            return []
+        # System virtual time follows the start tag of the frame in service (SFQ)
+        self._virtual_time = max(self._virtual_time, ready[0].virtual_time)
+        batch = []
+        for session in ready:
+            session.virtual_time = max(session.virtual_time, self._virtual_time) + 1.0 / session.weight
+            session.in_flight = True
+            if session.max_fps:
+                session.next_frame_at = now + 1.0 / session.max_fps
+            batch.append((session.mailbox.take(), session))
+        return batch
+
+    def _next_deadline(self, now):
+        """Seconds until an FPS-capped session with a waiting frame becomes ready, or None."""
+        waits = [s.next_frame_at - now for s in self.sessions
+                 if s.mailbox.pending and not s.in_flight and s.next_frame_at > now]
+        return max(0.0, min(waits)) if waits else None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.perf_counter()
+            batch = self._pick(now) if self._running < self.max_in_flight else []
+            if batch:
+                self._running += 1
+                task = asyncio.create_task(self._serve(batch))
+                self._rounds.add(task)
+                task.add_done_callback(self._rounds.discard)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._next_deadline(now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _serve(self, batch):
+        try:
+            await self.process_batch(batch)
+        except Exception as e:
+            self.log(f"Error in video scheduler round: {e}")
+        finally:
+            for _, session in batch:
+                session.in_flight = False
+            self._running -= 1
+            self.rounds_run += 1
+            self.frames_run += len(batch)
+            self._round_sizes[len(batch)] += 1
+            self._wakeup.set()
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "queue_depth": self.queue_depth(),
+            "max_batch": self.max_batch,
+            "max_in_flight": self.max_in_flight,
+            "rounds": self.rounds_run,
+            "frames": self.frames_run,
+            "avg_frames_per_round": round(self.frames_run / self.rounds_run, 2) if self.rounds_run else 0.0,
+            "round_size_histogram": dict(sorted(self._round_sizes.items())),
+        }
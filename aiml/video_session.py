@@ -0,0 +1,123 @@
+""" Per-connection state for /ws/video.
+    The connection's receive task only parks the newest frame in a one-slot
+    mailbox; the shared scheduler (video_scheduler.py) takes it from there when
+    it is this session's turn. A frame replaced before it is taken is dropped,
+    so results describe the current scene instead of a backlog in the socket
+    buffer.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+
+
+class LatestFrameMailbox:
+    def __init__(self):
+        self._item = None
+        self.dropped = 0
+
+    def put(self, item):
+        """Park item, replacing (and counting as dropped) a frame that is still waiting."""
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+
+    @property
+    def pending(self):
+        return self._item is not None
+
+    def take(self):
+        """The waiting frame (or None), emptying the slot."""
+        item, self._item = self._item, None
+        return item
+
+
+def _percentiles(values):
+    if not values:
+        return {"last": None, "p50": None, "p95": None}
+    ordered = sorted(values)
+    return {
+        "last": round(values[-1], 1),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+    }
+
+
+class VideoSession:
+    def __init__(self, websocket, tracker=None, scene_gate=None, result_encoder=None, resolution=None, camera_id=None, weight=1.0, max_fps=0.0, window=100):
+        self.websocket = websocket
+        self.mailbox = LatestFrameMailbox()
+        # Scheduling: share of inference relative to other cameras, and an optional FPS cap
+        self.camera_id = camera_id
+        self.weight = weight
+        self.max_fps = max_fps
+        self.virtual_time = 0.0
+        self.next_frame_at = 0.0
+        self.in_flight = False
+        # IoUTracker for this stream (tracker.py), or None when tracking is off
+        self.tracker = tracker
+        # SceneChangeGate (scene_gate.py), or None when every frame is processed
+        self.scene_gate = scene_gate
+        # Last fresh detection_results message, reused for frames the gate skips
+        self.last_result = None
+        # DeltaResultEncoder (ws_protocol.py) for ?results=delta clients, or None for JSON results
+        self.result_encoder = result_encoder
+        # ResolutionController (resolution.py) when adaptive resolution is on
+        self.resolution = resolution
+        # The receive task and the scheduler both send (results, pongs, errors); one message at a time
+        self._send_lock = asyncio.Lock()
+        self.connected_at = time.time()
+
+        self.frames_received = 0
+        self.frames_processed = 0
+        self._latencies_ms = deque(maxlen=window)
+        self._queue_waits_ms = deque(maxlen=window)
+
+    async def send_json(self, payload):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(payload))
+
+    async def send_result(self, response):
+        """A detection_results message in the format this client asked for."""
+        if self.result_encoder is None:
+            await self.send_json(response)
+            return
+        message = self.result_encoder.encode(response)
+        async with self._send_lock:
+            await self.websocket.send_bytes(message)
+
+    def frame_received(self, item):
+        self.frames_received += 1
+        self.mailbox.put(item)
+
+    def frame_done(self, received_at, started_at):
+        """Record one processed frame; returns its receive-to-result latency in ms."""
+        now = time.perf_counter()
+        latency_ms = (now - received_at) * 1000
+        self.frames_processed += 1
+        self._latencies_ms.append(latency_ms)
+        self._queue_waits_ms.append((started_at - received_at) * 1000)
+        return latency_ms
+
+    def stats(self):
+        stats = {
+            "camera_id": self.camera_id,
+            "weight": self.weight,
+            "max_fps": self.max_fps,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.mailbox.dropped,
+            "drop_rate": round(self.mailbox.dropped / self.frames_received, 4) if self.frames_received else 0.0,
+            "latency_ms": _percentiles(self._latencies_ms),
+            "queue_wait_ms": _percentiles(self._queue_waits_ms),
+        }
+        if self.tracker is not None:
+            stats["tracking"] = self.tracker.stats()
+        if self.resolution is not None:
+            stats["resolution"] = self.resolution.stats()
+        if self.result_encoder is not None:
+            stats["results"] = self.result_encoder.stats()
+        if self.scene_gate is not None:
+            stats["scene_gate"] = self.scene_gate.stats()
+        return stats
@@ -0,0 +1,126 @@
+""" Sampled per-stage tracing for /ws/video.
+    Every sample_every-th frame of a connection carries a FrameTrace through the
+    pipeline and collects stage timings (receive, json, b64decode, imdecode,
+    queue, gate, resize, yolo, crops, cnn, send). Stages shared by a scheduler
+    round (yolo, cnn) are timed once and added to every traced frame in it.
+    Finished traces go to an in-memory ring buffer, read back through
+    /debug/video_traces; stdout only gets a periodic one-line summary and
+    rate-limited messages, so no frame pays for synchronous logging.
+"""
+import json
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+
+class FrameTrace:
+    __slots__ = ("camera_id", "frame_count", "started", "stages", "fields")
+
+    def __init__(self, camera_id, frame_count, started=None):
+        self.camera_id = camera_id
+        self.frame_count = frame_count
+        self.started = started if started is not None else time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+
+    def add(self, stage, ms):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+
+def timed(trace, stage):
+    """trace.stage(stage), or a no-op for frames that are not sampled."""
+    return trace.stage(stage) if trace is not None else nullcontext()
+
+
+def add_stage(traces, stage, ms):
+    for trace in traces:
+        if trace is not None:
+            trace.add(stage, ms)
+
+
+def _percentile(ordered, q):
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 2)
+
+
+class VideoTracer:
+    def __init__(self, sample_every=10, capacity=512, log_interval_s=10.0):
+        """
+        sample_every: trace one frame in this many per connection (0 disables tracing).
+        log_interval_s: period of the stdout summary, and the minimum gap between
+            two messages with the same key.
+        """
+        self.sample_every = max(0, int(sample_every))
+        self.log_interval_s = log_interval_s
+        self.traces = deque(maxlen=max(1, int(capacity)))
+        self.traced = 0
+        self._last_logged = {}
+        self._suppressed = {}
+        self._last_summary = time.monotonic()
+
+    def start(self, camera_id, frame_count, received_index, started=None):
+        """A FrameTrace if this frame is sampled (received_index counts the connection's frames), else None."""
+        if not self.sample_every or received_index % self.sample_every:
+            return None
+        return FrameTrace(camera_id, frame_count, started)
+
+    def finish(self, trace, **fields):
+        if trace is None:
+            return
+        trace.fields.update(fields)
+        self.traces.append({
+            "camera_id": trace.camera_id,
+            "frame_count": trace.frame_count,
+            "at": time.time(),
+            "total_ms": round((time.perf_counter() - trace.started) * 1000, 2),
+            "stages_ms": {stage: round(ms, 2) for stage, ms in trace.stages.items()},
+            **trace.fields,
+        })
+        self.traced += 1
+        now = time.monotonic()
+        if now - self._last_summary >= self.log_interval_s:
+            self._last_summary = now
+            print(json.dumps({"event": "video_trace_summary", "stages_p50_ms": {
+                stage: values["p50"] for stage, values in self.summary()["stages_ms"].items()}}))
+
+    def log(self, key, message):
+        """print(message) at most once per log_interval_s for each key; repeats in between are counted."""
+        now = time.monotonic()
+        if now - self._last_logged.get(key, float("-inf")) < self.log_interval_s:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        suppressed = self._suppressed.pop(key, 0)
+        self._last_logged[key] = now
+        print(json.dumps({"event": key, "message": message, "suppressed": suppressed}))
+
+    def recent(self, camera_id=None, limit=50):
+        traces = [t for t in self.traces if camera_id is None or t["camera_id"] == camera_id]
+        return traces[-limit:] if limit > 0 else []
+
+    def summary(self, camera_id=None):
+        """count/p50/p95/max per stage (and for the total) over the traces in the buffer."""
+        traces = self.recent(camera_id, len(self.traces))
+        per_stage = {}
+        for trace in traces:
+            for stage, ms in trace["stages_ms"].items():
+                per_stage.setdefault(stage, []).append(ms)
+            per_stage.setdefault("total", []).append(trace["total_ms"])
+        stages = {}
+        for stage, values in per_stage.items():
+            values.sort()
+            stages[stage] = {"count": len(values), "p50": _percentile(values, 0.5),
+                             "p95": _percentile(values, 0.95), "max": round(values[-1], 2)}
+        return {
+            "sample_every": self.sample_every,
+            "traced_frames": self.traced,
+            "buffered": len(traces),
+            "stages_ms": stages,
+            "suppressed_logs": dict(self._suppressed),
+        }
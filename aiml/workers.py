@@ -0,0 +1,251 @@
+""" Executors that keep image decoding and model inference off the asyncio event loop.
+    Inference always runs on threads (the models live in this process and torch
+    releases the GIL); decoding can optionally use a process pool, either
+    returning frames through the pipe ("process") or through shared memory
+    ("shm", see decode_pool.py).
+
+    Also owns the process-wide CPU settings: torch intra-op / inter-op thread
+    counts and optional CPU pinning, so several workers on one box do not each
+    spread every forward pass over every core.
+"""
+import asyncio
+import base64
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import torch
+
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "2"))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "2"))
+DECODE_POOL = os.getenv("DECODE_POOL", "thread")  # "thread", "process" or "shm"
+DECODE_SHM_SLOTS = int(os.getenv("DECODE_SHM_SLOTS", "16"))  # frames held in shared memory at once
+DECODE_SHM_MAX_SIZE = os.getenv("DECODE_SHM_MAX_SIZE", "1920x1080")  # pixel budget per slot, WxH
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))  # intra-op threads, 0 = torch default
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))  # 0 = torch default
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "")  # e.g. "0-3,8"; empty = no pinning
+
+_inference_pool = None
+_decode_pool = None
+_shared_decode_pool = None
+
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def image_size(data):
+    """(width, height) from the image header without decoding it, or None."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def reduced_decode_flag(width, height, target_size):
+    """
+    The imdecode flag with the largest downscale (2/4/8) that keeps both sides at
+    least target_size. JPEG scales during the DCT, so a reduced decode is also
+    much faster; other formats are decoded and then resized.
+    """
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if -(-width // factor) >= target_size and -(-height // factor) >= target_size:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(data, target_size=None):
+    """
+    Decode encoded image bytes (JPEG/PNG/WebP...) to a BGR ndarray, or None.
+    Any buffer works; a memoryview is read in place without copying.
+    target_size: smallest side the consumer needs (e.g. the YOLO input size);
+    bigger images are decoded at 1/2, 1/4 or 1/8 resolution.
+    """
+    nparr = np.frombuffer(data, np.uint8)
+    flag = cv2.IMREAD_COLOR
+    if target_size:
+        size = image_size(data)
+        if size is not None:
+            flag = reduced_decode_flag(*size, target_size)
+    return cv2.imdecode(nparr, flag)
+
+
+def decode_base64_image(data, target_size=None):
+    """Decode a base64 string holding an encoded image to a BGR ndarray, or None."""
+    return decode_image(base64.b64decode(data), target_size)
+
+
+def decode_image_timed(data, target_size=None):
+    """decode_image plus its stage timings in ms (for the /ws/video trace)."""
+    started = time.perf_counter()
+    frame = decode_image(data, target_size)
+    return frame, {"imdecode": (time.perf_counter() - started) * 1000}
+
+
+def decode_base64_image_timed(data, target_size=None):
+    """decode_base64_image plus its stage timings in ms (for the /ws/video trace)."""
+    started = time.perf_counter()
+    raw = base64.b64decode(data)
+    decoded = time.perf_counter()
+    frame = decode_image(raw, target_size)
+    return frame, {"b64decode": (decoded - started) * 1000, "imdecode": (time.perf_counter() - decoded) * 1000}
+
+
+def parse_cpu_list(spec):
+    """'0-3,8' -> [0, 1, 2, 3, 8]"""
+    cpus = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def worker_cpus(index, count, cpus=None):
+    """The contiguous slice of cpus (default: all usable) that worker `index` of `count` gets."""
+    cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+    per_worker = max(1, len(cpus) // count)
+    start = (index * per_worker) % len(cpus)
+    return cpus[start:start + per_worker]
+
+
+def configure_threads(intra=None, interop=None, cpus=None):
+    """
+    Apply thread and affinity settings to this process; call it before any
+    inference thread starts, since new threads inherit the affinity and torch
+    thread count of the thread that creates them. When pinned without an
+    explicit intra-op count, torch uses one thread per pinned core.
+    """
+    global TORCH_THREADS
+    intra = TORCH_THREADS if intra is None else intra
+    interop = TORCH_INTEROP_THREADS if interop is None else interop
+    if cpus is None and CPU_AFFINITY:
+        cpus = parse_cpu_list(CPU_AFFINITY)
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        if not intra:
+            intra = len(cpus)
+    if intra:
+        TORCH_THREADS = intra
+        torch.set_num_threads(intra)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            # Only settable once per process, before any inter-op work
+            pass
+    return thread_settings()
+
+
+def apply_thread_settings():
+    """
+    Re-apply the intra-op thread count on the calling thread. ultralytics resets
+    it when it sets up its predictor, and torch keeps the count per thread.
+    """
+    if TORCH_THREADS and torch.get_num_threads() != TORCH_THREADS:
+        torch.set_num_threads(TORCH_THREADS)
+
+
+def thread_settings():
+    return {
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "cpu_affinity": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None,
+        "inference_threads": INFERENCE_THREADS,
+    }
+
+
+def get_inference_pool():
+    global _inference_pool
+    if _inference_pool is None:
+        _inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference",
+                                             initializer=apply_thread_settings)
+    return _inference_pool
+
+
+def get_decode_pool():
+    global _decode_pool
+    if _decode_pool is None:
+        if DECODE_POOL == "process":
+            _decode_pool = ProcessPoolExecutor(max_workers=DECODE_WORKERS)
+        else:
+            # With DECODE_POOL=shm only frame decoding goes to processes; hashes and signatures stay on threads
+            _decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+    return _decode_pool
+
+
+def get_shared_decode_pool():
+    global _shared_decode_pool
+    if _shared_decode_pool is None:
+        from decode_pool import SharedDecodePool
+
+        max_width, max_height = (int(v) for v in DECODE_SHM_MAX_SIZE.lower().split('x'))
+        _shared_decode_pool = SharedDecodePool(DECODE_WORKERS, DECODE_SHM_SLOTS, max_height, max_width)
+    return _shared_decode_pool
+
+
+async def run_inference(fn, *args):
+    """Await fn(*args) on the inference thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_pool(), fn, *args)
+
+
+async def run_decode(fn, *args):
+    """
+    Await fn(*args) on the decode pool.
+    With DECODE_POOL=process, fn and its arguments must be picklable
+    (module-level functions such as decode_image); memoryviews are copied to
+    bytes for that, while the thread pool reads them in place.
+    """
+    if DECODE_POOL == "process":
+        args = tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_decode_pool(), fn, *args)
+
+
+def _no_release():
+    pass
+
+
+async def run_frame_decode(fn, data, *args):
+    """
+    Await a frame decoder fn(data, *args) (decode_image, decode_base64_image or
+    their _timed variants). Returns (result, release): with DECODE_POOL=shm the
+    frame is a view into shared memory, valid until release() is called; with
+    the other pools release does nothing. Call it once the frame is no longer used.
+    """
+    if DECODE_POOL == "shm":
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return await get_shared_decode_pool().decode(asyncio.get_running_loop(), fn, data, *args)
+    return await run_decode(fn, data, *args), _no_release
+
+
+def decode_stats():
+    stats = {"pool": DECODE_POOL, "workers": DECODE_WORKERS}
+    if _shared_decode_pool is not None:
+        stats["shared_memory"] = _shared_decode_pool.stats()
+    return stats
+
+
+def shutdown():
+    global _inference_pool, _decode_pool, _shared_decode_pool
+    for pool in (_inference_pool, _decode_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    if _shared_decode_pool is not None:
+        _shared_decode_pool.shutdown()
+    _inference_pool = None
+    _decode_pool = None
+    _shared_decode_pool = None
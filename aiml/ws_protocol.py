@@ -0,0 +1,201 @@
+""" Binary frame messages for /ws/video.
+    A binary WebSocket message is an 8-byte little-endian header followed by the
+    encoded image, sent as-is (no base64, no JSON):
+
+        offset 0  2 bytes  magic b"RQ"
+        offset 2  uint8    protocol version (1)
+        offset 3  uint8    image format (0 = JPEG, 1 = WebP, 2 = PNG)
+        offset 4  uint32   frame_count
+
+    Text messages keep the original JSON protocol ({"type": "frame", "frame": <base64>}).
+
+    Results are JSON by default. A client that connects with ?results=delta gets
+    each detection_results message as a binary delta against the previous one
+    instead: a 36-byte header, then added/changed detections, then removed ids.
+
+        header   2s magic b"RD", uint8 version (2), uint8 flags (1 = snapshot,
+                 2 = scene unchanged), uint32 frame_count, float64 unix time,
+                 float32 latency_ms, uint32 dropped_frames, float32 skipped_ratio
+                 (NaN without the scene gate), uint16 upserts, uint16 removed,
+                 uint16 yolo_size, uint16 cnn_size (the adaptive resolution the
+                 result was computed at; 0 when adaptive resolution is off)
+        upsert   uint32 id (track_id, or list position without tracking),
+                 int16 x1, y1, x2, y2 (640x640 space), uint8 confidence * 255,
+                 uint8 prediction (0 unknown, 1 fresh, 2 rotten), uint16 class
+                 (0 apple, n object_n)
+        removed  uint32 id
+
+    A snapshot lists every current detection and replaces the client's state;
+    the first message is one, and a client can ask for one with {"type": "snapshot"}.
+"""
+import math
+import struct
+import time
+
+FRAME_HEADER = struct.Struct('<2sBBI')
+FRAME_MAGIC = b'RQ'
+PROTOCOL_VERSION = 1
+FRAME_FORMATS = {0: 'jpeg', 1: 'webp', 2: 'png'}
+
+
+def parse_frame_message(data):
+    """
+    Split a binary message into (frame_count, format, payload). The payload is
+    a memoryview into the message, so the image bytes are never copied before
+    cv2.imdecode reads them.
+    """
+    if len(data) <= FRAME_HEADER.size:
+        raise ValueError("Binary frame message is too short")
+    magic, version, image_format, frame_count = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Binary frame message has no RQ header")
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported frame protocol version {version}")
+    if image_format not in FRAME_FORMATS:
+        raise ValueError(f"Unsupported frame format {image_format}")
+    return frame_count, FRAME_FORMATS[image_format], memoryview(data)[FRAME_HEADER.size:]
+
+
+def build_frame_message(frame_count, payload, image_format='jpeg'):
+    """Client side of the protocol (used by tools and tests that stream frames)."""
+    codes = {name: code for code, name in FRAME_FORMATS.items()}
+    return FRAME_HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, codes[image_format], frame_count) + bytes(payload)
+
+
+RESULT_MAGIC = b'RD'
+RESULT_VERSION = 2
+RESULT_HEADER = struct.Struct('<2sBBIdfIfHHHH')
+RESULT_UPSERT = struct.Struct('<I4hBBH')
+RESULT_REMOVED = struct.Struct('<I')
+FLAG_SNAPSHOT = 1
+FLAG_SCENE_UNCHANGED = 2
+PREDICTIONS = ('unknown', 'fresh', 'rotten')
+
+
+MAX_CLASS_CODE = 0xFFFF
+
+
+def _class_code(name):
+    code = 0 if name == "apple" else int(name.rsplit("_", 1)[-1])
+    if not 0 <= code <= MAX_CLASS_CODE:
+        raise ValueError(f"Class id {code} does not fit the result protocol (0-{MAX_CLASS_CODE})")
+    return code
+
+
+def _class_name(code):
+    return "apple" if code == 0 else f"object_{code}"
+
+
+def _box_value(v):
+    return max(-32768, min(32767, int(v)))
+
+
+class DeltaResultEncoder:
+    """Per-connection encoder: remembers what the client holds and sends only the difference."""
+
+    def __init__(self):
+        self._sent = {}
+        self._snapshot_requested = True
+        self.messages = 0
+        self.snapshots = 0
+        self.bytes_sent = 0
+
+    def request_snapshot(self):
+        self._snapshot_requested = True
+
+    def encode(self, response):
+        """Binary message for a detection_results dict (see the module docstring)."""
+        records = {}
+        for position, detection in enumerate(response["detections"]):
+            key = detection.get("track_id", position)
+            records[key] = (
+                *(_box_value(v) for v in detection["box"]),
+                min(255, max(0, round(detection["confidence"] * 255))),
+                PREDICTIONS.index(detection.get("prediction", "unknown")),
+                _class_code(detection["class"]),
+            )
+
+        snapshot = self._snapshot_requested
+        if snapshot:
+            upserts, removed = records, []
+            self._snapshot_requested = False
+            self.snapshots += 1
+        else:
+            upserts = {key: record for key, record in records.items() if self._sent.get(key) != record}
+            removed = [key for key in self._sent if key not in records]
+        self._sent = records
+
+        skipped_ratio = response.get("skipped_ratio")
+        resolution = response.get("resolution") or {}
+        flags = (FLAG_SNAPSHOT if snapshot else 0) | (FLAG_SCENE_UNCHANGED if response.get("scene_unchanged") else 0)
+        parts = [RESULT_HEADER.pack(
+            RESULT_MAGIC, RESULT_VERSION, flags, response["frame_count"], time.time(),
+            response.get("latency_ms", 0.0), response.get("dropped_frames", 0),
+            math.nan if skipped_ratio is None else skipped_ratio, len(upserts), len(removed),
+            resolution.get("yolo") or 0, resolution.get("cnn") or 0
+        )]
+        parts.extend(RESULT_UPSERT.pack(key, *record) for key, record in upserts.items())
+        parts.extend(RESULT_REMOVED.pack(key) for key in removed)
+        message = b"".join(parts)
+
+        self.messages += 1
+        self.bytes_sent += len(message)
+        return message
+
+    def stats(self):
+        return {
+            "format": "delta",
+            "messages": self.messages,
+            "snapshots": self.snapshots,
+            "avg_message_bytes": round(self.bytes_sent / self.messages, 1) if self.messages else 0.0,
+        }
+
+
+def parse_result_message(data):
+    """Decode a delta result message into a dict (client side, for tools and dashboards)."""
+    if len(data) < RESULT_HEADER.size:
+        raise ValueError("Result message is too short")
+    (magic, version, flags, frame_count, timestamp, latency_ms, dropped_frames,
+     skipped_ratio, n_upserts, n_removed, yolo_size, cnn_size) = RESULT_HEADER.unpack_from(data)
+    if magic != RESULT_MAGIC or version != RESULT_VERSION:
+        raise ValueError(f"Not a version {RESULT_VERSION} result message")
+    offset = RESULT_HEADER.size
+    upserts = {}
+    for _ in range(n_upserts):
+        key, x1, y1, x2, y2, confidence, prediction, class_code = RESULT_UPSERT.unpack_from(data, offset)
+        offset += RESULT_UPSERT.size
+        upserts[key] = {
+            "box": [x1, y1, x2, y2],
+            "class": _class_name(class_code),
+            "confidence": confidence / 255,
+            "prediction": PREDICTIONS[prediction],
+        }
+    removed = [RESULT_REMOVED.unpack_from(data, offset + i * RESULT_REMOVED.size)[0] for i in range(n_removed)]
+    return {
+        "snapshot": bool(flags & FLAG_SNAPSHOT),
+        "scene_unchanged": bool(flags & FLAG_SCENE_UNCHANGED),
+        "frame_count": frame_count,
+        "timestamp": timestamp,
+        "latency_ms": latency_ms,
+        "dropped_frames": dropped_frames,
+        "skipped_ratio": None if math.isnan(skipped_ratio) else skipped_ratio,
+        "resolution": {"yolo": yolo_size, "cnn": cnn_size} if yolo_size else None,
+        "upserts": upserts,
+        "removed": removed,
+    }
+
+
+class DeltaResultDecoder:
+    """Client-side state: apply each message, read back the full detection list."""
+
+    def __init__(self):
+        self.detections = {}
+
+    def apply(self, data):
+        message = parse_result_message(data)
+        if message["snapshot"]:
+            self.detections = {}
+        for key in message["removed"]:
+            self.detections.pop(key, None)
+        self.detections.update(message["upserts"])
+        return message
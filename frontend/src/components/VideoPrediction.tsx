@@ -5,6 +5,7 @@ interface Detection {
   class: string;
   confidence: number;
   prediction?: string;
+  track_id?: number;
   timestamp: string;
 }
 
@@ -14,6 +15,9 @@ const VideoPrediction: React.FC = () => {
   const [detections, setDetections] = useState<Detection[]>([]);
   const [frameCount, setFrameCount] = useState(0);
   const [fps, setFps] = useState(0);
+  const [latencyMs, setLatencyMs] = useState<number | null>(null);
+  const [droppedFrames, setDroppedFrames] = useState(0);
+  const [skippedRatio, setSkippedRatio] = useState<number | null>(null);
   const [connectionStatus, setConnectionStatus] = useState<'disconnected' | 'connecting' | 'connected'>('disconnected');
   const [error, setError] = useState<string | null>(null);
   
@@ -24,6 +28,8 @@ const VideoPrediction: React.FC = () => {
   const animationFrameRef = useRef<number | null>(null);
   const lastFrameTimeRef = useRef<number>(0);
   const frameCountRef = useRef<number>(0);
+  // Send time per frame_count, to measure capture-to-result latency when results come back
+  const sentAtRef = useRef<Map<number, number>>(new Map());
 
   const startStream = useCallback(async () => {
     try {
@@ -63,6 +69,16 @@ const VideoPrediction: React.FC = () => {
           if (data.type === 'detection_results') {
             setDetections(data.detections);
             setFrameCount(data.frame_count);
+            // The server drops frames it could not get to, so older entries never get a result
+            const sentAt = sentAtRef.current.get(data.frame_count);
+            if (sentAt !== undefined) {
+              setLatencyMs(Math.round(performance.now() - sentAt));
+            }
+            sentAtRef.current.forEach((_, count) => {
+              if (count <= data.frame_count) sentAtRef.current.delete(count);
+            });
+            setDroppedFrames(data.dropped_frames ?? 0);
+            setSkippedRatio(data.skipped_ratio ?? null);
             setError(null); // Clear any previous errors
           } else if (data.type === 'error') {
             console.error('Server error:', data.message);
@@ -97,6 +113,10 @@ const VideoPrediction: React.FC = () => {
     setDetections([]);
     setFrameCount(0);
     setFps(0);
+    setLatencyMs(null);
+    setDroppedFrames(0);
+    setSkippedRatio(null);
+    sentAtRef.current.clear();
     
     // Stop animation frame
     if (animationFrameRef.current) {
@@ -168,7 +188,8 @@ const VideoPrediction: React.FC = () => {
         ctx.lineWidth = 2;
         ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
 
-        const label = `${detection.class} (${(confidence * 100).toFixed(1)}%) - ${prediction}`;
+        const trackLabel = detection.track_id !== undefined ? ` #${detection.track_id}` : '';
+        const label = `${detection.class}${trackLabel} (${(confidence * 100).toFixed(1)}%) - ${prediction}`;
         const labelWidth = ctx.measureText(label).width + 10;
         const labelHeight = 20;
 
@@ -180,27 +201,27 @@ const VideoPrediction: React.FC = () => {
         ctx.fillText(label, x1 + 5, y1 - 5);
     });
         
-        // Convert to base64
-        const frameData = canvas.toDataURL('image/jpeg', 0.8);
-        const base64Data = frameData.split(',')[1];
-        console.log("Base64 length:", base64Data.length);
-      
-      // Send frame to server
-      const message = {
-        type: 'frame',
-        frame: base64Data,
-        frame_count: frameCountRef.current
-      };
-      
+      // Send the JPEG as a binary message (see aiml/ws_protocol.py): 8-byte header + raw bytes, no base64
       if (websocketRef.current?.readyState === WebSocket.OPEN) {
-        console.log("Sending frame message:", message); 
-        websocketRef.current.send(JSON.stringify(message));
+        const frameCount = frameCountRef.current;
         frameCountRef.current++;
-        
-        // Log every 30 frames for debugging
-        if (frameCountRef.current % 30 === 0) {
-          console.log(`Sent frame ${frameCountRef.current}, frame size: ${base64Data.length} chars`);
-        }
+        canvas.toBlob((blob) => {
+          const ws = websocketRef.current;
+          if (!blob || ws?.readyState !== WebSocket.OPEN) return;
+          const header = new DataView(new ArrayBuffer(8));
+          header.setUint8(0, 0x52); // 'R'
+          header.setUint8(1, 0x51); // 'Q'
+          header.setUint8(2, 1);    // protocol version
+          header.setUint8(3, 0);    // 0 = JPEG
+          header.setUint32(4, frameCount, true);
+          ws.send(new Blob([header.buffer, blob]));
+          sentAtRef.current.set(frameCount, performance.now());
+
+          // Log every 30 frames for debugging
+          if (frameCount % 30 === 0) {
+            console.log(`Sent frame ${frameCount}, frame size: ${blob.size} bytes`);
+          }
+        }, 'image/jpeg', 0.8);
       } else {
         console.warn('WebSocket not open, frame not sent');
       }
@@ -361,6 +382,18 @@ const VideoPrediction: React.FC = () => {
                   <span className="text-gray-600">Frame Count:</span>
                   <span className="font-medium">{frameCount}</span>
                 </div>
+                <div className="flex justify-between">
+                  <span className="text-gray-600">Latency:</span>
+                  <span className="font-medium">{latencyMs !== null ? `${latencyMs} ms` : '-'}</span>
+                </div>
+                <div className="flex justify-between">
+                  <span className="text-gray-600">Dropped Frames:</span>
+                  <span className="font-medium">{droppedFrames}</span>
+                </div>
+                <div className="flex justify-between">
+                  <span className="text-gray-600">Static Frames Skipped:</span>
+                  <span className="font-medium">{skippedRatio !== null ? `${Math.round(skippedRatio * 100)}%` : '-'}</span>
+                </div>
                 <div className="flex justify-between">
                   <span className="text-gray-600">Objects Detected:</span>
                   <span className="font-medium">{detections.length}</span>